@@ -3,196 +3,256 @@ Implement the DPE algorithm.
     Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
 """
 import numpy as np
-import pandas as pd
+import random
 from embedding.parameters import *
-from embedding.scenario import bar, para
+from embedding.dag_store import load_DAG_store
+from embedding.algos.runner import run_DAGs
+from embedding.profiler import NULL_PROFILER
+from embedding.result_store import ResultWriter, ResultStore, get_schedule
+from embedding.scenario import bar, para, to_ratio_arrays, get_DAG_costs
 
 
 class DPE:
-    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream):
+    # records the phases and events of schedule_DAG() (see profiler.Profiler)
+    profiler = NULL_PROFILER
+
+    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream,
+                 ratio_arrays=None, trace_costs=False):
         # get the generated edge computing scenario
         self.G, self.bw, self.pp = G, bw, pp
         self.simple_paths, self.reciprocals_list, self.proportions_list = simple_paths, reciprocals_list, proportions_list
         # get the generated functions' requirements
         self.pp_required, self.data_stream = pp_required, data_stream
+        # with trace_costs, the requirements of each DAG are derived from the trace (see scenario.get_DAG_costs())
+        self.trace_costs = trace_costs
+        # the outputs of get_ratio() as arrays, converted from the lists if they are not given
+        if ratio_arrays is None:
+            ratio_arrays = to_ratio_arrays(reciprocals_list, proportions_list)
+        self.ratio_arrays = ratio_arrays
+
+        # proportions[m][n] and first_reciprocals[m][n] are the proportion of data stream which routes through the
+        # first simple path from server m to n and the sum of the reciprocal of bandwidth of this path (zeros if m == n)
+        self.proportions, self.first_reciprocals = ratio_arrays.proportions, ratio_arrays.first_reciprocals
+        # process_cost[i][n] is the processing time of function i + 1 on server n
+        self.process_cost = np.asarray(pp_required)[:, np.newaxis] / np.asarray(pp)
 
-    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH):
+    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                          result_path=None):
         """
         Calculate the overall finish time of all DAGs achieved by DPE algorithm.
+        The DAGs are scheduled by workers processes (see runner.run_DAGs()).
+        With profiler (see profiler.Profiler), the phases and events of each DAG are recorded and the DAGs are
+        scheduled in this process.
+        With result_path, the results are streamed into a result store (see result_store.py) instead of being kept
+        in memory, and the store opened is returned.
+        """
+        # the profiler is used by schedule_DAG() during this run
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('DPE')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+
+            makespan_of_all_DAGs = 0
+            DAGs_deploy = []
+            T_optimal_all = []
+            start_time_all = []
+            process_sequence_all = []
+            writer = None if result_path is None else ResultWriter(result_path)
+
+            all_DAG_num = len(DAG_store)
+            calculated_num = 0
+            print('\nGetting makespan for %d DAGs by DPE algorithm ...' % all_DAG_num)
+            try:
+                for _, (T_optimal, funcs_deploy, process_sequence, start_time, makespan) in \
+                        run_DAGs(self, DAG_store, workers=workers, seed=seed, profiler=self.profiler):
+                    makespan_of_all_DAGs += makespan
+                    if writer is not None:
+                        writer.append(get_schedule(T_optimal, funcs_deploy, process_sequence, start_time, makespan))
+                    else:
+                        DAGs_deploy.append(funcs_deploy)
+                        process_sequence_all.append(process_sequence)
+                        T_optimal_all.append(T_optimal)
+                        start_time_all.append(start_time)
+
+                    calculated_num += 1
+                    percent = calculated_num / float(all_DAG_num) * 100
+                    # for overflow
+                    if percent > 100:
+                        percent = 100
+                    bar.update(percent)
+            except BaseException:
+                # remove the partial results
+                if writer is not None:
+                    writer.abort()
+                raise
+            print('The overall makespan achieved by DPE: %f second' % makespan_of_all_DAGs)
+            print('The average makespan: %f second' % (makespan_of_all_DAGs / all_DAG_num))
+        finally:
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+        if writer is not None:
+            writer.close()
+            return ResultStore.load(result_path)
+        return T_optimal_all, DAGs_deploy, process_sequence_all, start_time_all
+
+    def iter_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                           DAG_ids=None):
+        """
+        Schedule the DAGs like get_response_time(), but yield (DAG_id, schedule) (see result_store.Schedule) as soon
+        as each DAG is scheduled. The DAGs are read lazily from the DAG store and no results are kept, thus the memory
+        used does not grow with the number of DAGs.
+        With DAG_ids (indices or job_names), only these DAGs are scheduled. With seed, they get the same results as
+        in a run of all the DAGs.
+        """
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('DPE')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+            for DAG_id, result in run_DAGs(self, DAG_store, workers=workers, seed=seed, DAG_ids=DAG_ids,
+                                             profiler=self.profiler):
+                yield DAG_id, get_schedule(*result)
+        finally:
+            # also when the generator is closed before all the DAGs are scheduled
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+
+    def schedule_DAG(self, DAG, rng=random, server_runtime=None):
+        """
+        Schedule a DAG of the DAG store by DPE algorithm. DPE is deterministic, rng is not used.
+        server_runtime is the moment when each server finishes the functions scheduled before the DAG (the servers
+        are idle by default, see online.OnlineScheduler).
+        Return T_optimal, the deployment of functions, the sequence they are processed, their start time and
+        the makespan.
+
+        The earliest finish time of a function on all the servers is computed at once with array operations:
+            T_optimal[func] = max over dependencies d of (T_optimal[d][p(d)] + trans_cost(p(d), :)) + process_cost[func]
+        where trans_cost(m, :) = proportions[m] * data_stream[d] * first_reciprocals[m].
         """
-        if not os.path.exists(sorted_DAG_path):
-            print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
-            return
-
-        df = pd.read_csv(sorted_DAG_path)
-        df_len = df.shape[0]
-        idx = 0
-
-        makespan_of_all_DAGs = 0
-        DAGs_deploy = []
-        T_optimal_all = []
-        start_time_all = []
-        process_sequence_all = []
-
-        required_num = REQUIRED_NUM
-        all_DAG_num = sum(required_num)
-        calculated_num = 0
-        print('\nGetting makespan for %d DAGs by DPE algorithm ...' % all_DAG_num)
-        while idx < df_len:
-            # get a DAG
-            DAG_name = df.loc[idx, 'job_name']
-            DAG_len = 0
-            while (idx + DAG_len < df_len) and (df.loc[idx + DAG_len, 'job_name'] == DAG_name):
-                DAG_len = DAG_len + 1
-            DAG = df.loc[idx: idx + DAG_len]
-            DAG_pp_required = self.pp_required[:DAG_len]
+        profiler = self.profiler
+        profiler.begin('costs')
+        DAG_len = len(DAG.funcs)
+        if self.trace_costs:
+            DAG_pp_required, DAG_data_stream = get_DAG_costs(DAG)
+            process_cost = DAG_pp_required[:, np.newaxis] / np.asarray(self.pp)
+        else:
             DAG_data_stream = self.data_stream[:DAG_len]
+            # process_cost[i][n] is the processing time of function i + 1 on server n
+            process_cost = self.process_cost[:DAG_len]
+        profiler.end('costs')
 
-            # T_optimal stores the earliest finish time of each function on each server
-            T_optimal = np.zeros((DAG_len, para.get_server_num()))
-            start_time = np.zeros(DAG_len)
-            funcs_deploy = -1 * np.ones(DAG_len)
-            process_sequence = []
-            # server_runtime records the moment when the newest func on each server is finished
+        profiler.begin('placement')
+        # the number of times T_optimal of a deployed function is recomputed
+        recomputations = 0
+
+        # T_optimal stores the earliest finish time of each function on each server
+        T_optimal = np.zeros((DAG_len, para.get_server_num()))
+        start_time = np.zeros(DAG_len)
+        funcs_deploy = -1 * np.ones(DAG_len)
+        process_sequence = []
+        # server_runtime records the moment when the newest func on each server is finished
+        online = server_runtime is not None
+        if server_runtime is None:
             server_runtime = np.zeros(para.get_server_num())
+        else:
+            server_runtime = np.array(server_runtime, dtype=float)
 
-            makespan = 0
-            for j in range(DAG_len + 1):
-                if j == DAG_len:
-                    # this is the dummy tail function, update all the exit functions' deployment and return the makespan
-                    # makespan is the slowest 'exit function's earliest finish time'
-                    for e in range(DAG_len):
-                        if funcs_deploy[e] == -1.:
-                            funcs_deploy[e] = int(np.argmin(T_optimal[e]))
-                            process_sequence.append(e + 1)
-                            if min(T_optimal[e]) > makespan:
-                                makespan = min(T_optimal[e])
-                    break
-
-                # get the number of this function and stores in func
-                name_str_list = DAG.loc[j + idx, 'task_name'].strip().split('_')
-                name_str_list_len = len(name_str_list)
-                func_str_len = len(name_str_list[0])
-                func_num = int(name_str_list[0][1:func_str_len])
-
-                if name_str_list_len == 1:
-                    # func is an entry function
-                    pass
-                else:
-                    # func is not an entry function, func has dependencies
-                    # enumerate the deployment of func
-                    for n in range(para.get_server_num()):
-                        # get t(p(f_j)) where p(f_j) is n
-                        process_cost = DAG_pp_required[func_num - 1] / self.pp[n]
-                        all_min_phi = []
-                        for i in range(name_str_list_len - 1):
-                            if name_str_list[i + 1] == '':
-                                continue
-                            dependent_func_num = int(name_str_list[i + 1])
-
-                            if funcs_deploy[dependent_func_num - 1] != -1.:
-                                # dependent_func_num has been deployed beforehand, get min_phi directly
-                                # ==== DIR_PATH is where we can improved (maybe in the next paper) ====
-                                # For example, for DAG 'M2, R4_2 and R5_2', M2's placement is decided by R4 if we
-                                # process (M2, R4) firstly. R5 will not affect the placement of M2. However, we don't
-                                # know that if we process (M2, R5) firstly, whether the makespan can be decreased further.
-                                # =================================================================
-                                where_deployed = int(funcs_deploy[dependent_func_num - 1])
-                                if n == funcs_deploy[dependent_func_num - 1]:
-                                    trans_cost = 0
-                                else:
-                                    trans_cost = self.proportions_list[where_deployed][n] * \
-                                                 DAG_data_stream[dependent_func_num - 1] * \
-                                                 self.reciprocals_list[where_deployed][n][0]
-                                min_phi = T_optimal[dependent_func_num - 1][where_deployed] + trans_cost + process_cost
-                                all_min_phi.append(min_phi)
-                                continue
-
-                            for h in range(DAG_len):
-                                name_str_list_inner = DAG.loc[h + idx, 'task_name'].strip().split('_')
-                                func_str_inner_len = len(name_str_list_inner[0])
-                                if int(name_str_list_inner[0][1:func_str_inner_len]) != dependent_func_num:
-                                    continue
-                                else:
-                                    # dependent_func_num is found
-                                    name_str_list_inner_len = len(name_str_list_inner)
-                                    if name_str_list_inner_len == 1:
-                                        # dependent_func_num is an entry function. Set its T_optimal
-                                        T_optimal[dependent_func_num - 1] = \
-                                            DAG_pp_required[dependent_func_num - 1] / self.pp + server_runtime
-                                    else:
-                                        # although T_optimal of dependent_func_num has been set, but it has to be
-                                        # updated because server_runtime may changed!!!
-                                        process_begin_time = np.zeros(para.get_server_num())
-                                        for k in range(para.get_server_num()):
-                                            min_process_begin_time = 0
-                                            # dependent_func_num is deployed on k
-                                            for h_inner in range(name_str_list_inner_len - 1):
-                                                # dependent_func_num's one predecessor and its deployment
-                                                if name_str_list_inner[h_inner + 1] == '':
-                                                    continue
-                                                dependent_func_num_predecessor = int(name_str_list_inner[h_inner + 1])
-                                                where_deployed_predecessor = int(funcs_deploy[dependent_func_num_predecessor - 1])
-                                                if where_deployed_predecessor == -1.:
-                                                    print('Sth. wrong! It\'s impossible!')
-                                                if k == where_deployed_predecessor:
-                                                    trans_cost = 0
-                                                else:
-                                                    trans_cost = self.proportions_list[where_deployed_predecessor][k] * \
-                                                                 DAG_data_stream[dependent_func_num - 1] * \
-                                                                 self.reciprocals_list[where_deployed_predecessor][k][0]
-                                                tmp = T_optimal[dependent_func_num_predecessor - 1][where_deployed_predecessor] + trans_cost
-                                                # the process of dependent_func_num can be started if and only if the slowest predecessor of it has finished data transfer
-                                                if tmp > min_process_begin_time:
-                                                    min_process_begin_time = tmp
-                                            if min_process_begin_time > server_runtime[k]:
-                                                process_begin_time[k] = min_process_begin_time
-                                            else:
-                                                process_begin_time[k] = server_runtime[k]
-
-                                        T_optimal[dependent_func_num - 1] = \
-                                            DAG_pp_required[dependent_func_num - 1] / self.pp + process_begin_time
-                                    break
-
-                            # decide the optimal deployment for dependent_func_num
-                            min_phi = MAX_VALUE
-                            selected_server = -1
-                            for m in range(para.get_server_num()):
-                                if n == m:
-                                    trans_cost = 0
-                                else:
-                                    trans_cost = self.proportions_list[m][n] * \
-                                                 DAG_data_stream[dependent_func_num - 1] * \
-                                                 self.reciprocals_list[m][n][0]
-                                phi = T_optimal[dependent_func_num - 1][m] + trans_cost + process_cost
-                                if phi < min_phi:
-                                    min_phi = phi
-                                    selected_server = m
-
-                            # this is where a function really be deployed
-                            funcs_deploy[dependent_func_num - 1] = selected_server
-                            process_sequence.append(dependent_func_num)
-                            server_runtime[selected_server] = T_optimal[dependent_func_num - 1][selected_server]
-                            start_time[dependent_func_num - 1] = server_runtime[selected_server] - DAG_pp_required[
-                                dependent_func_num - 1] / self.pp[selected_server]
-                            all_min_phi.append(min_phi)
-
-                        # now, all the predecessors of func has been deployed, use their T_optimal to update T_optimal of func
-                        T_optimal[func_num - 1][n] = max(all_min_phi)
-
-            makespan_of_all_DAGs += makespan
-            DAGs_deploy.append(funcs_deploy)
-            process_sequence_all.append(process_sequence)
-            T_optimal_all.append(T_optimal)
-            start_time_all.append(start_time)
-
-            calculated_num += 1
-            percent = calculated_num / float(all_DAG_num) * 100
-            # for overflow
-            if percent > 100:
-                percent = 100
-            bar.update(percent)
-            idx += DAG_len
-        print('The overall makespan achieved by DPE: %f second' % makespan_of_all_DAGs)
-        print('The average makespan: %f second' % (makespan_of_all_DAGs / sum(REQUIRED_NUM)))
-        return T_optimal_all, DAGs_deploy, process_sequence_all, start_time_all
+        for j in range(DAG_len):
+            func_num = DAG.funcs[j]
+            dependent_funcs = DAG.parents[j]
+            if len(dependent_funcs) == 0:
+                # func is an entry function
+                continue
+
+            # func is not an entry function, func has dependencies
+            # the dependencies which have not been deployed are deployed when func is placed on the first server
+            # ==== DIR_PATH is where we can improved (maybe in the next paper) ====
+            # For example, for DAG 'M2, R4_2 and R5_2', M2's placement is decided by R4 if we
+            # process (M2, R4) firstly. R5 will not affect the placement of M2. However, we don't
+            # know that if we process (M2, R5) firstly, whether the makespan can be decreased further.
+            # =================================================================
+            for dependent_func_num in dependent_funcs:
+                d = dependent_func_num - 1
+                if funcs_deploy[d] != -1.:
+                    continue
+
+                h = DAG.rows.get(dependent_func_num)
+                if h is not None:
+                    recomputations += 1
+                    dependent_funcs_inner = DAG.parents[h]
+                    if len(dependent_funcs_inner) == 0:
+                        # dependent_func_num is an entry function. Set its T_optimal
+                        T_optimal[d] = process_cost[d] + server_runtime
+                    else:
+                        # although T_optimal of dependent_func_num has been set, but it has to be
+                        # updated because server_runtime may changed!!!
+                        # the process of dependent_func_num can be started if and only if the slowest predecessor
+                        # of it has finished data transfer
+                        process_begin_time = np.maximum(self.arrival_time(
+                            T_optimal, funcs_deploy, dependent_funcs_inner, DAG_data_stream, DAG_data_stream[d]), 0)
+                        process_begin_time = np.maximum(process_begin_time, server_runtime)
+                        T_optimal[d] = process_cost[d] + process_begin_time
+
+                # decide the optimal deployment for dependent_func_num (func is placed on the first server)
+                phi = T_optimal[d] + self.proportions[:, 0] * DAG_data_stream[d] * self.first_reciprocals[:, 0] + \
+                    process_cost[func_num - 1][0]
+                selected_server = int(np.argmin(phi))
+                if not phi[selected_server] < MAX_VALUE:
+                    selected_server = -1
+
+                # this is where a function really be deployed
+                funcs_deploy[d] = selected_server
+                process_sequence.append(dependent_func_num)
+                server_runtime[selected_server] = T_optimal[d][selected_server]
+                start_time[d] = server_runtime[selected_server] - process_cost[d][selected_server]
+
+            # now, all the predecessors of func has been deployed, use their T_optimal to update T_optimal of func
+            T_optimal[func_num - 1] = \
+                self.arrival_time(T_optimal, funcs_deploy, dependent_funcs, DAG_data_stream, None) + \
+                process_cost[func_num - 1]
+
+        # this is the dummy tail function, update all the exit functions' deployment and return the makespan
+        # makespan is the slowest 'exit function's earliest finish time'
+        makespan = 0
+        exit_funcs = np.flatnonzero(funcs_deploy == -1.)
+        if online and len(exit_funcs) > 0:
+            # the exit functions can not begin before the servers finish the functions scheduled before (the isolated
+            # functions, whose T_optimal is still zero, begin then as well)
+            exit_process_cost = process_cost[exit_funcs]
+            T_optimal[exit_funcs] = np.where(T_optimal[exit_funcs] - exit_process_cost < server_runtime,
+                                             server_runtime + exit_process_cost, T_optimal[exit_funcs])
+        if len(exit_funcs) > 0:
+            funcs_deploy[exit_funcs] = np.argmin(T_optimal[exit_funcs], axis=1)
+            if online:
+                where_deployed = funcs_deploy[exit_funcs].astype(int)
+                start_time[exit_funcs] = T_optimal[exit_funcs, where_deployed] - \
+                    process_cost[exit_funcs, where_deployed]
+            process_sequence.extend((exit_funcs + 1).tolist())
+            slowest = T_optimal[exit_funcs].min(axis=1).max()
+            if slowest > makespan:
+                makespan = slowest
+
+        profiler.end('placement')
+        profiler.count('T_optimal_recomputations', recomputations)
+        return T_optimal, funcs_deploy, process_sequence, start_time, makespan
+
+    def arrival_time(self, T_optimal, funcs_deploy, dependent_funcs, DAG_data_stream, data_stream_size):
+        """
+        Get the moment when the data streams of all the dependent functions arrive at each server.
+        The data stream of each dependent function (DAG_data_stream) is transferred, unless data_stream_size is given.
+        """
+        predecessors = np.array(dependent_funcs) - 1
+        where_deployed = funcs_deploy[predecessors].astype(int)
+        if data_stream_size is None:
+            data_stream_size = DAG_data_stream[predecessors][:, np.newaxis]
+        trans_cost = self.proportions[where_deployed] * data_stream_size * self.first_reciprocals[where_deployed]
+        return (T_optimal[predecessors, where_deployed][:, np.newaxis] + trans_cost).max(axis=0)
@@ -3,21 +3,35 @@ Implement the FixDoc algorithm.
     Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
 """
 import numpy as np
-import pandas as pd
 import random
 from embedding.parameters import *
-from embedding.scenario import bar, para
+from embedding.dag_store import load_DAG_store
+from embedding.algos.runner import run_DAGs
+from embedding.profiler import NULL_PROFILER
+from embedding.result_store import ResultWriter, ResultStore, get_schedule
+from embedding.scenario import bar, para, to_ratio_arrays, choose_path_reciprocals, get_DAG_costs
 
 
 class FixDoc:
-    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream):
+    # records the phases and events of schedule_DAG() (see profiler.Profiler)
+    profiler = NULL_PROFILER
+
+    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream,
+                 ratio_arrays=None, trace_costs=False):
         # get the generated edge computing scenario
         self.G, self.bw, self.pp = G, bw, pp
         self.simple_paths, self.reciprocals_list, self.proportions_list = simple_paths, reciprocals_list, proportions_list
         # get the generated functions' requirements
         self.pp_required, self.data_stream = pp_required, data_stream
+        # with trace_costs, the requirements of each DAG are derived from the trace (see scenario.get_DAG_costs())
+        self.trace_costs = trace_costs
+        # the outputs of get_ratio() as arrays, converted from the lists if they are not given
+        if ratio_arrays is None:
+            ratio_arrays = to_ratio_arrays(reciprocals_list, proportions_list)
+        self.ratio_arrays = ratio_arrays
 
-    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH):
+    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                          result_path=None):
         """
         Calculate the overall finish time of all DAGs achieved by FixDoc algorithm.
         In FixDoc paper, the authors claim that a function might be executed repeatedly on multiple servers.
@@ -31,190 +45,251 @@ class FixDoc:
         (2) The more complicated the structure of the DAGs (e.g., many entry functions), the better DPE outperforms
         FixDoc.
         ==============
+
+        The DAGs are scheduled by workers processes. With seed, the paths of each DAG are chosen by its own random
+        number generator, thus the results do not depend on workers (see runner.run_DAGs()).
+        With profiler (see profiler.Profiler), the phases and events of each DAG are recorded and the DAGs are
+        scheduled in this process.
+        With result_path, the results are streamed into a result store (see result_store.py) instead of being kept
+        in memory, and the store opened is returned.
+        """
+        # the profiler is used by schedule_DAG() during this run
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('FixDoc')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+
+            makespan_of_all_DAGs = 0
+            DAGs_deploy = []
+            T_optimal_all = []
+            start_time_all = []
+            process_sequence_all = []
+            writer = None if result_path is None else ResultWriter(result_path)
+
+            all_DAG_num = len(DAG_store)
+            calculated_num = 0
+            print('\nGetting makespan for %d DAGs by FixDoc algorithm ...' % all_DAG_num)
+            try:
+                for _, (T_optimal, funcs_deploy, process_sequence, start_time, makespan) in \
+                        run_DAGs(self, DAG_store, workers=workers, seed=seed, profiler=self.profiler):
+                    makespan_of_all_DAGs += makespan
+                    if writer is not None:
+                        writer.append(get_schedule(T_optimal, funcs_deploy, process_sequence, start_time, makespan))
+                    else:
+                        start_time_all.append(start_time)
+                        DAGs_deploy.append(funcs_deploy)
+                        process_sequence_all.append(process_sequence)
+                        T_optimal_all.append(T_optimal)
+
+                    calculated_num += 1
+                    percent = calculated_num / float(all_DAG_num) * 100
+                    # for overflow
+                    if percent > 100:
+                        percent = 100
+                    bar.update(percent)
+            except BaseException:
+                # remove the partial results
+                if writer is not None:
+                    writer.abort()
+                raise
+            print('The overall makespan achieved by FixDoc: %f second' % makespan_of_all_DAGs)
+            print('The average makespan: %f second' % (makespan_of_all_DAGs / all_DAG_num))
+        finally:
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+        if writer is not None:
+            writer.close()
+            return ResultStore.load(result_path)
+        return T_optimal_all, DAGs_deploy, process_sequence_all, start_time_all
+
+    def iter_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                           DAG_ids=None):
+        """
+        Schedule the DAGs like get_response_time(), but yield (DAG_id, schedule) (see result_store.Schedule) as soon
+        as each DAG is scheduled. The DAGs are read lazily from the DAG store and no results are kept, thus the memory
+        used does not grow with the number of DAGs.
+        With DAG_ids (indices or job_names), only these DAGs are scheduled. With seed, they get the same results as
+        in a run of all the DAGs.
+        """
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('FixDoc')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+            for DAG_id, result in run_DAGs(self, DAG_store, workers=workers, seed=seed, DAG_ids=DAG_ids,
+                                             profiler=self.profiler):
+                yield DAG_id, get_schedule(*result)
+        finally:
+            # also when the generator is closed before all the DAGs are scheduled
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+
+    def schedule_DAG(self, DAG, rng=random, server_runtime=None):
+        """
+        Schedule a DAG of the DAG store by FixDoc algorithm. rng is the random number generator used for this DAG.
+        server_runtime is the moment when each server finishes the functions scheduled before the DAG (the servers
+        are idle by default, see online.OnlineScheduler).
+        Return T_optimal, the deployment of functions, the sequence they are processed, their start time and
+        the makespan.
         """
-        if not os.path.exists(sorted_DAG_path):
-            print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
-            return
-
-        df = pd.read_csv(sorted_DAG_path)
-        df_len = df.shape[0]
-        idx = 0
-
-        makespan_of_all_DAGs = 0
-        DAGs_deploy = []
-        T_optimal_all = []
-        start_time_all = []
-        process_sequence_all = []
-
-        required_num = REQUIRED_NUM
-        all_DAG_num = sum(required_num)
-        calculated_num = 0
-        print('\nGetting makespan for %d DAGs by FixDoc algorithm ...' % all_DAG_num)
-        while idx < df_len:
-            # get a DAG
-            DAG_name = df.loc[idx, 'job_name']
-            DAG_len = 0
-            while (idx + DAG_len < df_len) and (df.loc[idx + DAG_len, 'job_name'] == DAG_name):
-                DAG_len = DAG_len + 1
-            DAG = df.loc[idx: idx + DAG_len]
+        profiler = self.profiler
+        DAG_len = len(DAG.funcs)
+        if self.trace_costs:
+            DAG_pp_required, DAG_data_stream = get_DAG_costs(DAG)
+        else:
             DAG_pp_required = self.pp_required[:DAG_len]
             DAG_data_stream = self.data_stream[:DAG_len]
 
-            # T_optimal stores the earliest finish time of each function on each server
-            # (if the server n for func i is not idle when making decisions, T_optimal[i][n] is set as MAX_VALUE)
-            T_optimal = np.zeros((DAG_len, para.get_server_num()))
-            start_time = np.zeros(DAG_len)
-            funcs_deploy = -1 * np.ones(DAG_len)
-            process_sequence = []
-            # server_runtime records the moment when the newest func on each server is finished
+        # T_optimal stores the earliest finish time of each function on each server
+        # (if the server n for func i is not idle when making decisions, T_optimal[i][n] is set as MAX_VALUE)
+        T_optimal = np.zeros((DAG_len, para.get_server_num()))
+        start_time = np.zeros(DAG_len)
+        funcs_deploy = -1 * np.ones(DAG_len)
+        process_sequence = []
+        # server_runtime records the moment when the newest func on each server is finished
+        online = server_runtime is not None
+        if server_runtime is None:
             server_runtime = np.zeros(para.get_server_num())
+        else:
+            server_runtime = np.array(server_runtime, dtype=float)
 
-            # fix the path chosen between any two node
-            fix_path_reciprocals = np.zeros((para.get_server_num(), para.get_server_num()))
-            for n1 in range(para.get_server_num()):
-                for n2 in range(para.get_server_num()):
-                    if n1 != n2:
-                        paths_num = len(self.reciprocals_list[n1][n2])
-                        chosen_path = random.randint(0, paths_num - 1)
-                        fix_path_reciprocals[n1][n2] = self.reciprocals_list[n1][n2][chosen_path]
-
-            makespan = 0
-            for j in range(DAG_len + 1):
-                if j == DAG_len:
-                    # this is the dummy tail function, update all the exit functions' deployment
-                    for e in range(DAG_len):
-                        if funcs_deploy[e] == -1.:
-                            funcs_deploy[e] = int(np.argmin(T_optimal[e]))
-                            process_sequence.append(e + 1)
-                            if min(T_optimal[e]) > makespan:
-                                makespan = min(T_optimal[e])
-                    break
-
-                # get the number of this function: func
-                name_str_list = DAG.loc[j + idx, 'task_name'].strip().split('_')
-                name_str_list_len = len(name_str_list)
-                func_str_len = len(name_str_list[0])
-                func_num = int(name_str_list[0][1:func_str_len])
-
-                if name_str_list_len == 1:
-                    # func is an entry function
-                    pass
-                else:
-                    # func is not an entry function, func has dependencies
-                    # enumerate the deployment of func
-                    for n in range(para.get_server_num()):
-                        # get t(p(f_j)) where p(f_j) is n
-                        process_cost = DAG_pp_required[func_num - 1] / self.pp[n]
-                        all_min_phi = []
-                        for i in range(name_str_list_len - 1):
-                            if name_str_list[i + 1] == '':
-                                continue
-                            dependent_func_num = int(name_str_list[i + 1])
-
-                            if funcs_deploy[dependent_func_num - 1] != -1.:
-                                # dependent_func_num has been deployed beforehand, get min_phi directly
-                                # ==== DIR_PATH is where we can improved (maybe in the next paper) ====
-                                # For example, for DAG 'M2, R4_2 and R5_2', M2's placement is decided by R4 if we
-                                # process (M2, R4) firstly. R5 will not affect the placement of M2. However, we
-                                # don't know that if we process (M2, R5) firstly, whether the makespan can be
-                                # decreased further.
-                                # =================================================================
-                                where_deployed = int(funcs_deploy[dependent_func_num - 1])
-                                if n == funcs_deploy[dependent_func_num - 1]:
-                                    trans_cost = 0
-                                else:
-                                    trans_cost = DAG_data_stream[dependent_func_num - 1] * \
-                                                 fix_path_reciprocals[where_deployed][n]
-                                min_phi = T_optimal[dependent_func_num - 1][where_deployed] + trans_cost + process_cost
-                                all_min_phi.append(min_phi)
-                                continue
-
-                            for h in range(DAG_len):
-                                name_str_list_inner = DAG.loc[h + idx, 'task_name'].strip().split('_')
-                                func_str_inner_len = len(name_str_list_inner[0])
-                                if int(name_str_list_inner[0][1:func_str_inner_len]) != dependent_func_num:
-                                    continue
-                                else:
-                                    # dependent_func_num is found
-                                    name_str_list_inner_len = len(name_str_list_inner)
-                                    if name_str_list_inner_len == 1:
-                                        # dependent_func_num is an entry function. Set its T_optimal
-                                        T_optimal[dependent_func_num - 1] = \
-                                            DAG_pp_required[dependent_func_num - 1] / self.pp + server_runtime
-                                    else:
-                                        # although T_optimal of dependent_func_num has been set, but it has to be
-                                        # updated because server_runtime may changed!!!
-                                        process_begin_time = np.zeros(para.get_server_num())
-                                        for k in range(para.get_server_num()):
-                                            min_process_begin_time = 0
-                                            # dependent_func_num is deployed on k
-                                            for h_inner in range(name_str_list_inner_len - 1):
-                                                # dependent_func_num's one predecessor and its deployment
-                                                if name_str_list_inner[h_inner + 1] == '':
-                                                    continue
-                                                dependent_func_num_predecessor = int(name_str_list_inner[h_inner + 1])
-                                                where_deployed_predecessor = int(funcs_deploy[dependent_func_num_predecessor - 1])
-                                                if where_deployed_predecessor == -1.:
-                                                    print('Sth. wrong! It\'s impossible!')
-                                                if k == where_deployed_predecessor:
-                                                    trans_cost = 0
-                                                else:
-                                                    trans_cost = DAG_data_stream[dependent_func_num - 1] * \
-                                                                 fix_path_reciprocals[where_deployed_predecessor][k]
-                                                tmp = T_optimal[dependent_func_num_predecessor - 1][
-                                                          where_deployed_predecessor] + trans_cost
-                                                # the process of dependent_func_num can be started if and only if
-                                                # the slowest predecessor of it has finished data transfer
-                                                if tmp > min_process_begin_time:
-                                                    min_process_begin_time = tmp
-                                            if min_process_begin_time > server_runtime[k]:
-                                                process_begin_time[k] = min_process_begin_time
-                                            else:
-                                                process_begin_time[k] = server_runtime[k]
-
-                                        T_optimal[dependent_func_num - 1] = \
-                                            DAG_pp_required[dependent_func_num - 1] / self.pp + process_begin_time
-                                    break
-
-                            # decide the optimal deployment for dependent_func_num
-                            min_phi = MAX_VALUE
-                            selected_server = -1
-                            for m in range(para.get_server_num()):
-                                if n == m:
-                                    trans_cost = 0
-                                else:
-                                    trans_cost = DAG_data_stream[dependent_func_num - 1] * \
-                                                 fix_path_reciprocals[m][n]
-                                phi = T_optimal[dependent_func_num - 1][m] + trans_cost + process_cost
-                                if phi < min_phi:
-                                    min_phi = phi
-                                    selected_server = m
-
-                            # this is where a function really be deployed
-                            funcs_deploy[dependent_func_num - 1] = selected_server
-                            process_sequence.append(dependent_func_num)
-                            server_runtime[selected_server] = T_optimal[dependent_func_num - 1][selected_server]
-                            start_time[dependent_func_num - 1] = server_runtime[selected_server] - DAG_pp_required[
-                                dependent_func_num - 1] / self.pp[selected_server]
+        # fix the path chosen between any two node
+        profiler.begin('costs')
+        fix_path_reciprocals = choose_path_reciprocals(self.ratio_arrays, rng)
+        profiler.end('costs')
+
+        profiler.begin('placement')
+        # the number of times T_optimal of a deployed function is recomputed
+        recomputations = 0
+        makespan = 0
+        for j in range(DAG_len + 1):
+            if j == DAG_len:
+                # this is the dummy tail function, update all the exit functions' deployment
+                for e in range(DAG_len):
+                    if funcs_deploy[e] == -1.:
+                        if online:
+                            # the exit function can not begin before the servers finish the functions scheduled
+                            # before (an isolated function, whose T_optimal is still zero, begins then as well)
+                            process_cost = DAG_pp_required[e] / self.pp
+                            T_optimal[e] = np.where(T_optimal[e] - process_cost < server_runtime,
+                                                    server_runtime + process_cost, T_optimal[e])
+                        funcs_deploy[e] = int(np.argmin(T_optimal[e]))
+                        if online:
+                            start_time[e] = T_optimal[e][int(funcs_deploy[e])] - \
+                                DAG_pp_required[e] / self.pp[int(funcs_deploy[e])]
+                        process_sequence.append(e + 1)
+                        if min(T_optimal[e]) > makespan:
+                            makespan = min(T_optimal[e])
+                break
+
+            # get the number of this function and its dependencies
+            func_num = DAG.funcs[j]
+            dependent_funcs = DAG.parents[j]
+
+            if len(dependent_funcs) == 0:
+                # func is an entry function
+                pass
+            else:
+                # func is not an entry function, func has dependencies
+                # enumerate the deployment of func
+                for n in range(para.get_server_num()):
+                    # get t(p(f_j)) where p(f_j) is n
+                    process_cost = DAG_pp_required[func_num - 1] / self.pp[n]
+                    all_min_phi = []
+                    for dependent_func_num in dependent_funcs:
+                        if funcs_deploy[dependent_func_num - 1] != -1.:
+                            # dependent_func_num has been deployed beforehand, get min_phi directly
+                            # ==== DIR_PATH is where we can improved (maybe in the next paper) ====
+                            # For example, for DAG 'M2, R4_2 and R5_2', M2's placement is decided by R4 if we
+                            # process (M2, R4) firstly. R5 will not affect the placement of M2. However, we
+                            # don't know that if we process (M2, R5) firstly, whether the makespan can be
+                            # decreased further.
+                            # =================================================================
+                            where_deployed = int(funcs_deploy[dependent_func_num - 1])
+                            if n == funcs_deploy[dependent_func_num - 1]:
+                                trans_cost = 0
+                            else:
+                                trans_cost = DAG_data_stream[dependent_func_num - 1] * \
+                                             fix_path_reciprocals[where_deployed][n]
+                            min_phi = T_optimal[dependent_func_num - 1][where_deployed] + trans_cost + process_cost
                             all_min_phi.append(min_phi)
+                            continue
 
-                        # now, all the predecessors of func has been deployed,
-                        # use their T_optimal to update T_optimal of func
-                        T_optimal[func_num - 1][n] = max(all_min_phi)
-
-            makespan_of_all_DAGs += makespan
-            DAGs_deploy.append(funcs_deploy)
-            process_sequence_all.append(process_sequence)
-            T_optimal_all.append(T_optimal)
-
-            calculated_num += 1
-            start_time_all.append(start_time)
-            percent = calculated_num / float(all_DAG_num) * 100
-            # for overflow
-            if percent > 100:
-                percent = 100
-            bar.update(percent)
-            idx += DAG_len
-        print('The overall makespan achieved by FixDoc: %f second' % makespan_of_all_DAGs)
-        print('The average makespan: %f second' % (makespan_of_all_DAGs / sum(REQUIRED_NUM)))
-        return T_optimal_all, DAGs_deploy, process_sequence_all, start_time_all
+                        h = DAG.rows.get(dependent_func_num)
+                        if h is not None:
+                            # dependent_func_num is found
+                            recomputations += 1
+                            dependent_funcs_inner = DAG.parents[h]
+                            if len(dependent_funcs_inner) == 0:
+                                # dependent_func_num is an entry function. Set its T_optimal
+                                T_optimal[dependent_func_num - 1] = \
+                                    DAG_pp_required[dependent_func_num - 1] / self.pp + server_runtime
+                            else:
+                                # although T_optimal of dependent_func_num has been set, but it has to be
+                                # updated because server_runtime may changed!!!
+                                process_begin_time = np.zeros(para.get_server_num())
+                                for k in range(para.get_server_num()):
+                                    min_process_begin_time = 0
+                                    # dependent_func_num is deployed on k
+                                    for dependent_func_num_predecessor in dependent_funcs_inner:
+                                        # dependent_func_num's one predecessor and its deployment
+                                        where_deployed_predecessor = int(funcs_deploy[dependent_func_num_predecessor - 1])
+                                        if where_deployed_predecessor == -1.:
+                                            print('Sth. wrong! It\'s impossible!')
+                                        if k == where_deployed_predecessor:
+                                            trans_cost = 0
+                                        else:
+                                            trans_cost = DAG_data_stream[dependent_func_num - 1] * \
+                                                         fix_path_reciprocals[where_deployed_predecessor][k]
+                                        tmp = T_optimal[dependent_func_num_predecessor - 1][
+                                                  where_deployed_predecessor] + trans_cost
+                                        # the process of dependent_func_num can be started if and only if
+                                        # the slowest predecessor of it has finished data transfer
+                                        if tmp > min_process_begin_time:
+                                            min_process_begin_time = tmp
+                                    if min_process_begin_time > server_runtime[k]:
+                                        process_begin_time[k] = min_process_begin_time
+                                    else:
+                                        process_begin_time[k] = server_runtime[k]
+
+                                T_optimal[dependent_func_num - 1] = \
+                                    DAG_pp_required[dependent_func_num - 1] / self.pp + process_begin_time
+
+                        # decide the optimal deployment for dependent_func_num
+                        min_phi = MAX_VALUE
+                        selected_server = -1
+                        for m in range(para.get_server_num()):
+                            if n == m:
+                                trans_cost = 0
+                            else:
+                                trans_cost = DAG_data_stream[dependent_func_num - 1] * \
+                                             fix_path_reciprocals[m][n]
+                            phi = T_optimal[dependent_func_num - 1][m] + trans_cost + process_cost
+                            if phi < min_phi:
+                                min_phi = phi
+                                selected_server = m
+
+                        # this is where a function really be deployed
+                        funcs_deploy[dependent_func_num - 1] = selected_server
+                        process_sequence.append(dependent_func_num)
+                        server_runtime[selected_server] = T_optimal[dependent_func_num - 1][selected_server]
+                        start_time[dependent_func_num - 1] = server_runtime[selected_server] - DAG_pp_required[
+                            dependent_func_num - 1] / self.pp[selected_server]
+                        all_min_phi.append(min_phi)
+
+                    # now, all the predecessors of func has been deployed,
+                    # use their T_optimal to update T_optimal of func
+                    T_optimal[func_num - 1][n] = max(all_min_phi)
+
+        profiler.end('placement')
+        profiler.count('T_optimal_recomputations', recomputations)
+        return T_optimal, funcs_deploy, process_sequence, start_time, makespan
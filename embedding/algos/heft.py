@@ -5,109 +5,390 @@ This script refers the code from https://github.com/mrocklin/heft/.
 (function ---> job, edge server ---> agent)
     Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
 """
-import pandas as pd
 import numpy as np
 import random
 from collections import namedtuple
 from functools import partial
-from itertools import chain
-from embedding.scenario import bar, para
+from embedding.scenario import bar, para, to_ratio_arrays, choose_path_reciprocals, get_DAG_costs
 from embedding.utils import reverse_dict
 from embedding.parameters import *
+from embedding.dag_store import load_DAG_store
+from embedding.algos.runner import run_DAGs
+from embedding.profiler import NULL_PROFILER
+from embedding.result_store import ResultWriter, ResultStore, get_HEFT_schedule
 
 
 def get_agents():
     """
     Agents start from zero.
     """
-    servers = [str(n) for n in range(para.get_server_num())]
-    return ''.join(servers)
+    return [str(n) for n in range(para.get_server_num())]
 
 
-all_agents = get_agents()
 Event = namedtuple('Event', 'job start end')
 
 
+class TimelineNode:
+    """
+    A job of a Timeline, i.e., a node of the treap in the order of start time. gap is the idle time before the job
+    (since prev_end, the end of the previous job, or time 0), max_gap is the largest gap of the subtree.
+    """
+    __slots__ = ['job', 'start', 'end', 'prev_end', 'gap', 'max_gap', 'size', 'priority', 'left', 'right']
+
+    def __init__(self, job, start, end, prev_end, priority):
+        self.job, self.start, self.end = job, start, end
+        self.prev_end, self.gap = prev_end, start - prev_end
+        self.max_gap, self.size = self.gap, 1
+        self.priority = priority
+        self.left, self.right = None, None
+
+    def update(self):
+        self.size, self.max_gap = 1, self.gap
+        for child in (self.left, self.right):
+            if child is not None:
+                self.size += child.size
+                if child.max_gap > self.max_gap:
+                    self.max_gap = child.max_gap
+
+
+def split(node, k):
+    """
+    Split the treap into the first k jobs and the others.
+    """
+    if node is None:
+        return None, None
+    left_size = node.left.size if node.left is not None else 0
+    if k <= left_size:
+        left, node.left = split(node.left, k)
+        node.update()
+        return left, node
+    node.right, right = split(node.right, k - left_size - 1)
+    node.update()
+    return node, right
+
+
+def merge(left, right):
+    """
+    Merge two treaps, the jobs of left are before the jobs of right.
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = merge(left.right, right)
+        left.update()
+        return left
+    right.left = merge(left, right.left)
+    right.update()
+    return right
+
+
+class Timeline:
+    """
+    The jobs allocated to an agent, sorted by start time. They are kept in a treap (a balanced binary tree) whose
+    nodes hold the largest gap of their subtrees, thus both inserting a job and finding the first gap take
+    O(log n) expected time.
+    """
+    # the priorities of the nodes, not drawn from random, which may be the rng of the DAGs
+    priorities = random.Random(0)
+
+    def __init__(self):
+        self.root, self.last = None, None
+        self.end_times = dict()
+        # the number of nodes visited by find_first_gap()
+        self.scan_steps = 0
+
+    def __len__(self):
+        return 0 if self.root is None else self.root.size
+
+    def rank(self, time):
+        """
+        The number of jobs which start no later than time.
+        """
+        node, rank = self.root, 0
+        while node is not None:
+            if node.start <= time:
+                rank += (node.left.size if node.left is not None else 0) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def get_node(self, i):
+        """
+        The i-th job.
+        """
+        node = self.root
+        while True:
+            left_size = node.left.size if node.left is not None else 0
+            if i < left_size:
+                node = node.left
+            elif i == left_size:
+                return node
+            else:
+                i -= left_size + 1
+                node = node.right
+
+    def insert(self, job, start, end):
+        """
+        Insert job after the jobs which start no later than it. The gap before the next job shrinks.
+        """
+        i = self.rank(start)
+        self.end_times[job] = end
+        if i == len(self):
+            # append it after the last job
+            node = TimelineNode(job, start, end, self.last.end if self.last is not None else 0,
+                                Timeline.priorities.random())
+            self.root, self.last = merge(self.root, node), node
+            return
+        prev_end = self.get_node(i - 1).end if i > 0 else 0
+        left, right = split(self.root, i)
+        node = TimelineNode(job, start, end, prev_end, Timeline.priorities.random())
+        following, right = split(right, 1)
+        following.prev_end, following.gap = end, following.start - end
+        following.update()
+        self.root = merge(merge(left, node), merge(following, right))
+
+    def end_time(self, job):
+        return self.end_times[job]
+
+    def find_gap_after(self, node, first, duration, offset=0):
+        """
+        Find the first job from the first-th one in the subtree of node with a gap longer than duration before it.
+        """
+        if node is None or node.max_gap <= duration or offset + node.size <= first:
+            return None
+        self.scan_steps += 1
+        found = self.find_gap_after(node.left, first, duration, offset)
+        if found is not None:
+            return found
+        i = offset + (node.left.size if node.left is not None else 0)
+        if i >= first and node.gap > duration:
+            return node
+        return self.find_gap_after(node.right, first, duration, i + 1)
+
+    def find_first_gap(self, desired_start_time, duration):
+        """
+        Find the first gap in the timeline. The gap must be after `desired_start_time` and of length at least
+        `duration`. A job starting no later than `desired_start_time` can not end a gap, thus the search begins at
+        the first job starting after `desired_start_time`, whose gap begins at `desired_start_time` at the earliest.
+        The gaps before the following jobs are found by the largest gaps of the subtrees.
+        """
+        n = len(self)
+        # No jobs: can fit it in whenever the job is ready to run
+        if n == 0:
+            return desired_start_time
+
+        first = self.rank(desired_start_time)
+        if first < n:
+            # Try to fit it in before the first job starting after desired_start_time
+            node = self.get_node(first)
+            earliest_start = max(desired_start_time, node.prev_end)
+            if node.start - earliest_start > duration:
+                self.scan_steps += 1
+                return earliest_start
+            # or before a later job
+            node = self.find_gap_after(self.root, first + 1, duration)
+            if node is not None:
+                return node.prev_end
+
+        # No gaps found: put it at the end, or whenever the task is ready
+        return max(self.last.end, desired_start_time)
+
+    def events(self):
+        events, stack, node = [], [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            events.append(Event(node.job, node.start, node.end))
+            node = node.right
+        return events
+
+
+class ProfiledTimeline(Timeline):
+    """
+    A Timeline which records the time of gap search into profiler.
+    """
+    def __init__(self, profiler):
+        Timeline.__init__(self)
+        self.profiler = profiler
+
+    def find_first_gap(self, desired_start_time, duration):
+        self.profiler.begin('gap_search')
+        start = Timeline.find_first_gap(self, desired_start_time, duration)
+        self.profiler.end('gap_search')
+        return start
+
+
+class CommCost:
+    """
+    The data transmission cost of a DAG. All the edges share one matrix of the reciprocal sums of the paths chosen
+    between any two servers, the cost of edge (ni, nj) is data_stream[ni - 1] * path_reciprocals[A][B] when ni is
+    placed on A and nj is placed on B.
+    """
+    def __init__(self, succ, DAG_data_stream, path_reciprocals):
+        self.succ = {ni: frozenset(funcs_num) for ni, funcs_num in succ.items() if funcs_num}
+        self.data_stream = DAG_data_stream
+        self.path_reciprocals = path_reciprocals
+        # the reciprocal sums between different servers (in the order of pairs), and the average cost of each size
+        self.n_pairs = para.get_n_pairs()
+        self.off_diagonal = path_reciprocals[~np.eye(len(path_reciprocals), dtype=bool)]
+        self.mean_cost = dict()
+
+    def get_mean_cost(self, size):
+        """
+        Average cost of transferring size over all pairs of different servers. The costs are summed up in the order
+        of pairs, thus the average is the same as summing up commcost() pair by pair.
+        """
+        if size not in self.mean_cost:
+            self.mean_cost[size] = 1. * sum((size * self.off_diagonal).tolist()) / self.n_pairs
+        return self.mean_cost[size]
+
+
 class HEFT:
-    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream):
+    # records the phases and events of schedule_DAG() (see profiler.Profiler)
+    profiler = NULL_PROFILER
+
+    def __init__(self, G, bw, pp, simple_paths, reciprocals_list, proportions_list, pp_required, data_stream,
+                 ratio_arrays=None, trace_costs=False):
         # get the generated edge computing scenario
         self.G, self.bw, self.pp = G, bw, pp
         self.simple_paths, self.reciprocals_list, self.proportions_list = simple_paths, reciprocals_list, proportions_list
         # get the generated functions' requirements
         self.pp_required, self.data_stream = pp_required, data_stream
+        # with trace_costs, the requirements of each DAG are derived from the trace (see scenario.get_DAG_costs())
+        self.trace_costs = trace_costs
+        # the outputs of get_ratio() as arrays, converted from the lists if they are not given
+        if ratio_arrays is None:
+            ratio_arrays = to_ratio_arrays(reciprocals_list, proportions_list)
+        self.ratio_arrays = ratio_arrays
 
-    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH):
+    def get_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                          result_path=None):
         """
         Calculate the overall finish time of all DAGs achieved by HEFT algorithm.
-        """
-        if not os.path.exists(sorted_DAG_path):
-            print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
-            return
+        The DAGs are scheduled by workers processes. With seed, the paths of each DAG are chosen by its own random
+        number generator, thus the results do not depend on workers (see runner.run_DAGs()).
+        With profiler (see profiler.Profiler), the phases and events of each DAG are recorded and the DAGs are
+        scheduled in this process.
+        With result_path, the results are streamed into a result store (see result_store.py) instead of being kept
+        in memory, and the store opened is returned.
+        """
+        # the profiler is used by schedule_DAG() during this run
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('HEFT')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+
+            makespan_of_all_DAGs = 0
+            DAGs_deploy = []
+            DAGs_orders = []
+            writer = None if result_path is None else ResultWriter(result_path)
+
+            all_DAG_num = len(DAG_store)
+            calculated_num = 0
+            print('\nGetting makespan for %d DAGs by HEFT algorithm ...' % all_DAG_num)
+            try:
+                for DAG_id, (orders, jobson, makespan) in \
+                        run_DAGs(self, DAG_store, workers=workers, seed=seed, profiler=self.profiler):
+                    makespan_of_all_DAGs += makespan
+                    if writer is not None:
+                        writer.append(get_HEFT_schedule(orders, jobson, makespan, DAG_store.get_DAG_len(DAG_id)))
+                    else:
+                        DAGs_deploy.append(jobson)
+                        DAGs_orders.append(orders)
+
+                    calculated_num += 1
+                    percent = calculated_num / float(all_DAG_num) * 100
+                    # for overflow
+                    if percent > 100:
+                        percent = 100
+                    bar.update(percent)
+            except BaseException:
+                # remove the partial results
+                if writer is not None:
+                    writer.abort()
+                raise
+
+            print('The overall makespan achieved by HEFT: %f second' % makespan_of_all_DAGs)
+            print('The average makespan: %f second' % (makespan_of_all_DAGs / all_DAG_num))
+        finally:
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+        if writer is not None:
+            writer.close()
+            return ResultStore.load(result_path)
+        return DAGs_orders, DAGs_deploy
 
-        df = pd.read_csv(sorted_DAG_path)
-        df_len = df.shape[0]
-        idx = 0
-
-        makespan_of_all_DAGs = 0
-        DAGs_deploy = []
-        DAGs_orders = []
-
-        required_num = REQUIRED_NUM
-        all_DAG_num = sum(required_num)
-        calculated_num = 0
-        print('\nGetting makespan for %d DAGs by HEFT algorithm ...' % all_DAG_num)
-        while idx < df_len:
-            # get a DAG
-            DAG_name = df.loc[idx, 'job_name']
-            DAG_len = 0
-            while (idx + DAG_len < df_len) and (df.loc[idx + DAG_len, 'job_name'] == DAG_name):
-                DAG_len = DAG_len + 1
-            DAG = df.loc[idx: idx + DAG_len]
+    def iter_response_time(self, sorted_DAG_path=SORTED_DAG_PATH, workers=1, seed=None, profiler=None,
+                           DAG_ids=None):
+        """
+        Schedule the DAGs like get_response_time(), but yield (DAG_id, schedule) (see result_store.Schedule) as soon
+        as each DAG is scheduled. The DAGs are read lazily from the DAG store and no results are kept, thus the memory
+        used does not grow with the number of DAGs.
+        With DAG_ids (indices or job_names), only these DAGs are scheduled. With seed, they get the same results as
+        in a run of all the DAGs.
+        """
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.profiler.begin_run('HEFT')
+        try:
+            self.profiler.begin('load')
+            DAG_store = load_DAG_store(sorted_DAG_path)
+            self.profiler.end('load')
+            if DAG_store is None:
+                print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+                return
+            for DAG_id, result in run_DAGs(self, DAG_store, workers=workers, seed=seed, DAG_ids=DAG_ids,
+                                             profiler=self.profiler):
+                yield DAG_id, get_HEFT_schedule(*result, DAG_store.get_DAG_len(DAG_id))
+        finally:
+            # also when the generator is closed before all the DAGs are scheduled
+            self.profiler.end_run()
+            self.profiler = NULL_PROFILER
+
+    def schedule_DAG(self, DAG, rng=random):
+        """
+        Schedule a DAG of the DAG store by HEFT algorithm. rng is the random number generator used for this DAG.
+        Return the orders of each server, the server of each function and the makespan.
+        """
+        profiler = self.profiler
+        profiler.begin('costs')
+        DAG_len = len(DAG.funcs)
+        if self.trace_costs:
+            DAG_pp_required, DAG_data_stream = get_DAG_costs(DAG)
+        else:
             DAG_pp_required = self.pp_required[:DAG_len]
             DAG_data_stream = self.data_stream[:DAG_len]
 
-            # get the information of the DAG
-            funcs_num = HEFT.get_funcs_num(DAG, idx, DAG_len)
-            succ = HEFT.parse_DAG_structure(DAG, idx, DAG_len)
-            comp_cost_array = self.get_comp_cost(funcs_num, DAG_pp_required)
-            comm_cost_array = self.get_comm_cost(succ, DAG_data_stream)
-
-            # schedule for this DAG
-            orders, jobson, makespan = HEFT.schedule(succ, all_agents,
-                                                     HEFT.compcost, comp_cost_array,
-                                                     HEFT.commcost, comm_cost_array)
-
-            makespan_of_all_DAGs += makespan
-            DAGs_deploy.append(jobson)
-            DAGs_orders.append(orders)
-
-            calculated_num += 1
-            percent = calculated_num / float(all_DAG_num) * 100
-            # for overflow
-            if percent > 100:
-                percent = 100
-            bar.update(percent)
-            idx += DAG_len
-
-        print('The overall makespan achieved by HEFT: %f second' % makespan_of_all_DAGs)
-        print('The average makespan: %f second' % (makespan_of_all_DAGs / sum(REQUIRED_NUM)))
-        return DAGs_orders, DAGs_deploy
+        # get the information of the DAG
+        funcs_num = HEFT.get_funcs_num(DAG)
+        succ = HEFT.parse_DAG_structure(DAG)
+        comp_cost_array = self.get_comp_cost(funcs_num, DAG_pp_required)
+        comm_cost = self.get_comm_cost(succ, DAG_data_stream, rng)
+        profiler.end('costs')
+
+        # schedule for this DAG
+        return HEFT.schedule(succ, get_agents(),
+                             HEFT.compcost, comp_cost_array,
+                             HEFT.commcost, comm_cost, profiler=profiler)
 
     @staticmethod
-    def get_funcs_num(DAG, idx, DAG_len):
+    def get_funcs_num(DAG):
         """
         Get each function's number sequentially for the given DAG.
         """
-        funcs_num = []
-        for i in range(DAG_len):
-            name_str_list = DAG.loc[i + idx, 'task_name'].strip().split('_')
-            func_str_len = len(name_str_list[0])
-            func_num = int(name_str_list[0][1:func_str_len])
-            funcs_num.append(func_num)
-        return funcs_num
+        return list(DAG.funcs)
 
     @staticmethod
-    def parse_DAG_structure(DAG, idx, DAG_len):
+    def parse_DAG_structure(DAG):
         """
         Get a DAG structure from the dataset. For example: for DAG
         "M1,12846.0,j_3,1,Terminated,157213,157295,100.0,0.3
@@ -139,24 +420,9 @@ class HEFT:
          13: (14,),
          14: ()}.
         """
-        succ_funcs = [[] for _ in range(DAG_len)]
-        for j in range(DAG_len):
-            name_str_list = DAG.loc[j + idx, 'task_name'].strip().split('_')
-            name_str_list_len = len(name_str_list)
-            func_str_len = len(name_str_list[0])
-            func_num = int(name_str_list[0][1:func_str_len])
-            if name_str_list_len == 1:
-                pass
-            else:
-                for i in range(name_str_list_len - 1):
-                    if name_str_list[i + 1] == '':
-                        continue
-                    dependent_func_num = int(name_str_list[i + 1])
-                    succ_funcs[dependent_func_num - 1].append(func_num)
         succ = dict()
-        for i in range(DAG_len):
-            succ[i + 1] = tuple(succ_funcs[i])
-        del succ_funcs
+        for i in range(len(DAG.funcs)):
+            succ[i + 1] = tuple(DAG.children[i])
         return succ
 
     def get_comp_cost(self, funcs_num, DAG_pp_required):
@@ -177,148 +443,117 @@ class HEFT:
     @staticmethod
     def wbar(ni, agents, compcost, comp_cost_array):
         """
-        Average computation cost.
+        Average computation cost (the agents are all the servers).
         """
-        return sum(compcost(ni, agent, comp_cost_array) for agent in agents) / len(agents)
+        return sum(comp_cost_array[ni].tolist()) / len(agents)
 
-    def get_comm_cost(self, succ, DAG_data_stream):
+    def get_comm_cost(self, succ, DAG_data_stream, rng=random):
         """
         Get the data transmission cost between any two servers for a given DAG.
         """
         # fix the path chosen between any two node
-        fix_path_reciprocals = np.zeros((para.get_server_num(), para.get_server_num()))
-        for n1 in range(para.get_server_num()):
-            for n2 in range(para.get_server_num()):
-                if n1 != n2:
-                    paths_num = len(self.reciprocals_list[n1][n2])
-                    chosen_path = random.randint(0, paths_num - 1)
-                    fix_path_reciprocals[n1][n2] = self.reciprocals_list[n1][n2][chosen_path]
-
-        comm_cost_array = []
-        for dependent_func_num, funcs_num in succ.items():
-            if funcs_num is ():
-                pass
-            else:
-                trans_size = DAG_data_stream[dependent_func_num - 1]
-                trans_cost = np.zeros((para.get_server_num(), para.get_server_num()))
-                for n1 in range(para.get_server_num()):
-                    for n2 in range(para.get_server_num()):
-                        if n1 != n2:
-                            trans_cost[n1][n2] = trans_size * fix_path_reciprocals[n1][n2]
-                comm_cost_array.append([dependent_func_num, funcs_num, trans_cost])
-        del fix_path_reciprocals
-        return comm_cost_array
+        fix_path_reciprocals = choose_path_reciprocals(self.ratio_arrays, rng)
+        return CommCost(succ, DAG_data_stream, fix_path_reciprocals)
 
     @staticmethod
-    def commcost(ni, nj, A, B, comm_cost_array):
+    def commcost(ni, nj, A, B, comm_cost):
         """
         Get the data transmission cost from ni to nj when ni is placed on A and nj is placed on B.
         """
-        a1 = int(A)
-        a2 = int(B)
-        for d in range(len(comm_cost_array)):
-            if ni == comm_cost_array[d][0]:
-                funcs_num = comm_cost_array[d][1]
-                for f in range(len(funcs_num)):
-                    if nj == funcs_num[f]:
-                        return comm_cost_array[d][2][a1][a2]
+        if nj in comm_cost.succ.get(ni, ()):
+            return comm_cost.data_stream[ni - 1] * comm_cost.path_reciprocals[int(A)][int(B)]
         return 0.
 
     @staticmethod
-    def cbar(ni, nj, agents, commcost, comm_cost_array):
+    def cbar(ni, nj, agents, commcost, comm_cost):
         """
         Average communication cost.
         """
         n = len(agents)
         if n == 1:
             return 0
-        n_pairs = para.get_n_pairs()
-        return 1. * sum(commcost(ni, nj, a1, a2, comm_cost_array) for a1 in agents for a2 in agents
-                        if a1 != a2) / n_pairs
+        if nj in comm_cost.succ.get(ni, ()):
+            return comm_cost.get_mean_cost(comm_cost.data_stream[ni - 1])
+        return 0.
 
     @staticmethod
-    def ranku(ni, agents, succ, compcost, commcost, comp_cost_array, comm_cost_array):
+    def ranku(ni, agents, succ, compcost, commcost, comp_cost_array, comm_cost):
         """
         Rank of job.
         This code is designed to mirror the wikipedia entry.
         Please see https://en.wikipedia.org/wiki/Heterogeneous_Earliest_Finish_Time for details.
+        To rank all the jobs of a DAG, use ranks() instead.
         """
-        rank = partial(HEFT.ranku, compcost=compcost, commcost=commcost,
-                       succ=succ, agents=agents, comp_cost_array=comp_cost_array, comm_cost_array=comm_cost_array)
-        w = partial(HEFT.wbar, agents=agents, compcost=compcost, comp_cost_array=comp_cost_array)
-        c = partial(HEFT.cbar, agents=agents, commcost=commcost, comm_cost_array=comm_cost_array)
-
-        if ni in succ and succ[ni]:
-            return w(ni) + max(c(ni, nj) + rank(nj) for nj in succ[ni])
-        else:
-            return w(ni)
+        return HEFT.ranks(agents, succ, compcost, commcost, comp_cost_array, comm_cost, jobs=[ni])[ni]
 
     @staticmethod
-    def end_time(job, events):
+    def ranks(agents, succ, compcost, commcost, comp_cost_array, comm_cost, jobs=None):
         """
-        Endtime of job in list of events.
+        Upward ranks of the jobs (all the jobs by default) and their descendants:
+            rank(ni) = wbar(ni) + max(cbar(ni, nj) + rank(nj) for nj in succ[ni]).
+        Each job is ranked once, after all its successors, by an iterative depth-first search (thus in reverse
+        topological order), which neither re-ranks shared descendants nor recurses.
         """
-        for e in events:
-            if e.job == job:
-                return e.end
-
-    @staticmethod
-    def find_first_gap(agent_orders, desired_start_time, duration):
-        """
-        Find the first gap in an agent's list of jobs. The gap must be after `desired_start_time`
-        and of length at least `duration`.
-        """
-        # No jobs: can fit it in whenever the job is ready to run
-        if (agent_orders is None) or (len(agent_orders)) == 0:
-            return desired_start_time
-
-        # Try to fit it in between each pair of Events, but first prepend a
-        # dummy Event which ends at time 0 to check for gaps before any real
-        # Event starts.
-        a = chain([Event(None, None, 0)], agent_orders[:-1])
-        for e1, e2 in zip(a, agent_orders):
-            earliest_start = max(desired_start_time, e1.end)
-            if e2.start - earliest_start > duration:
-                return earliest_start
-
-        # No gaps found: put it at the end, or whenever the task is ready
-        return max(agent_orders[-1].end, desired_start_time)
+        w = partial(HEFT.wbar, agents=agents, compcost=compcost, comp_cost_array=comp_cost_array)
+        c = partial(HEFT.cbar, agents=agents, commcost=commcost, comm_cost=comm_cost)
+        if jobs is None:
+            jobs = set(succ.keys()) | set(x for xx in succ.values() for x in xx)
+
+        rank = dict()
+        # the jobs on the search path, a successor on the path (a cycle) is ignored
+        visiting = set()
+        for job in jobs:
+            if job in rank:
+                continue
+            stack = [(job, iter(succ.get(job, ())))]
+            visiting.add(job)
+            while stack:
+                ni, successors = stack[-1]
+                for nj in successors:
+                    if nj not in rank and nj not in visiting:
+                        visiting.add(nj)
+                        stack.append((nj, iter(succ.get(nj, ()))))
+                        break
+                else:
+                    # all the successors of ni have been ranked
+                    stack.pop()
+                    visiting.discard(ni)
+                    ranked = [nj for nj in succ.get(ni, ()) if nj in rank]
+                    if ranked:
+                        rank[ni] = w(ni) + max(c(ni, nj) + rank[nj] for nj in ranked)
+                    else:
+                        rank[ni] = w(ni)
+        return rank
 
     @staticmethod
-    def start_time(agent, job, orders, jobson, prec, commcost, comm_cost_array, compcost, comp_cost_array):
+    def start_time(agent, job, orders, jobson, prec, commcost, comm_cost, compcost, comp_cost_array):
         """
-        Earliest time that job can be executed on agent.
+        Earliest time that job can be executed on agent. orders maps each agent to its Timeline.
         """
         duration = compcost(job, agent, comp_cost_array)
 
         if job in prec:
-            comm_ready = max([HEFT.end_time(p, orders[jobson[p]]) + commcost(p, job, agent, jobson[p], comm_cost_array)
+            comm_ready = max([orders[jobson[p]].end_time(p) + commcost(p, job, agent, jobson[p], comm_cost)
                               for p in prec[job]])
         else:
             comm_ready = 0
 
-        return HEFT.find_first_gap(orders[agent], comm_ready, duration)
+        return orders[agent].find_first_gap(comm_ready, duration)
 
     @staticmethod
-    def allocate(job, orders, jobson, prec, commcost, comm_cost_array, compcost, comp_cost_array):
+    def allocate(job, orders, jobson, prec, commcost, comm_cost, compcost, comp_cost_array):
         """
-        Allocate job to the machine with earliest finish time. Operates in place.
+        Allocate job to the machine with earliest finish time. Operates in place on the Timelines of orders.
         """
         st = partial(HEFT.start_time, job=job, orders=orders, jobson=jobson, prec=prec,
-                     commcost=commcost, comm_cost_array=comm_cost_array,
+                     commcost=commcost, comm_cost=comm_cost,
                      compcost=compcost, comp_cost_array=comp_cost_array)
+        starts = {machine: st(machine) for machine in orders.keys()}
         # ft = lambda machine: st(machine) + compcost(job, machine)
-        def ft(machine): return st(machine) + compcost(job, machine, comp_cost_array)
+        def ft(machine): return starts[machine] + compcost(job, machine, comp_cost_array)
 
         agent = min(orders.keys(), key=ft)
-        start = st(agent)
-        end = ft(agent)
-
-        orders[agent].append(Event(job, start, end))
-        orders[agent] = sorted(orders[agent], key=lambda e: e.start)
-        # Might be better to use a different data structure to keep each
-        # agent's orders sorted at a lower cost.
-
+        orders[agent].insert(job, starts[agent], ft(agent))
         jobson[job] = agent
 
     @staticmethod
@@ -329,7 +564,7 @@ class HEFT:
         return max(v[-1].end for v in orders.values() if v)
 
     @staticmethod
-    def schedule(succ, agents, compcost, comp_cost_array, commcost, comm_cost_array):
+    def schedule(succ, agents, compcost, comp_cost_array, commcost, comm_cost, ranks=None, profiler=NULL_PROFILER):
         """
         Schedule computation dag onto worker agents.
         inputs:
@@ -337,22 +572,35 @@ class HEFT:
         agents - set of agents that can perform work
         compcost - function :: job, agent -> runtime
         commcost - function :: j1, j2, a1, a2 -> communication time
+        ranks - the upward ranks of jobs computed by ranks(), computed here if not given
+        profiler - records the phases ranking, placement and gap_search, and counts the events (see profiler.py)
         """
-        rank = partial(HEFT.ranku, agents=agents, succ=succ,
-                       compcost=compcost, comp_cost_array=comp_cost_array,
-                       commcost=commcost, comm_cost_array=comm_cost_array)
+        if profiler.enabled:
+            commcost = profiler.counted(commcost, 'commcost_lookups')
+        if ranks is None:
+            profiler.begin('ranking')
+            ranks = HEFT.ranks(agents, succ, compcost, commcost, comp_cost_array, comm_cost)
+            profiler.end('ranking')
+
+        profiler.begin('placement')
         prec = reverse_dict(succ)
 
         jobs = set(succ.keys()) | set(x for xx in succ.values() for x in xx)
-        jobs = sorted(jobs, key=rank)
+        jobs = sorted(jobs, key=ranks.__getitem__)
 
-        orders = {agent: [] for agent in agents}
+        if profiler.enabled:
+            timelines = {agent: ProfiledTimeline(profiler) for agent in agents}
+        else:
+            timelines = {agent: Timeline() for agent in agents}
         jobson = dict()
         for job in reversed(jobs):
-            HEFT.allocate(job, orders, jobson, prec, commcost, comm_cost_array, compcost, comp_cost_array)
+            HEFT.allocate(job, timelines, jobson, prec, commcost, comm_cost, compcost, comp_cost_array)
+        profiler.count('gap_scan_steps', sum(timeline.scan_steps for timeline in timelines.values()))
 
+        orders = {agent: timeline.events() for agent, timeline in timelines.items()}
         for n in range(para.get_server_num()):
             orders['server ' + str(n + 1)] = orders.pop(str(n))
+        profiler.end('placement')
 
         return orders, jobson, HEFT.makespan(orders)
 
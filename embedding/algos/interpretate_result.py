@@ -5,24 +5,43 @@ Print the scheduling result for the appointed DAG.
 import pprint
 from collections import namedtuple
 from embedding.scenario import para
+from embedding.result_store import get_process_sequence
 
 
 Event = namedtuple('Event', 'start end')
 
 
-def print_scheduling_results(T_optimal_all, DAGs_deploy, process_sequence_all, start_time_all, DAG_num):
+def print_scheduling_results(T_optimal_all=None, DAGs_deploy=None, process_sequence_all=None, start_time_all=None,
+                             DAG_num=0, result_store=None):
     """
-    Print the scheduling results of the given DAG.
+    Print the scheduling results of the given DAG, taken from the results kept in memory, or from result_store
+    (see result_store.ResultStore) if it is given.
     """
+    if result_store is not None:
+        print_schedule(result_store.get_schedule(DAG_num), DAG_num)
+        return
+
     DAG_deploy = DAGs_deploy[DAG_num]
     T_optimal = T_optimal_all[DAG_num]
     process_sequence = process_sequence_all[DAG_num]
     start_time = start_time_all[DAG_num]
+    print_schedules(DAG_deploy, process_sequence, start_time,
+                    lambda func: T_optimal[func - 1][int(DAG_deploy[func - 1])], DAG_num)
+
+
+def print_schedule(schedule, DAG_num):
+    """
+    Print a Schedule (see result_store.py), e.g., yielded by iter_response_time().
+    """
+    print_schedules(schedule.placements, get_process_sequence(schedule), schedule.start_times,
+                    lambda func: schedule.finish_times[func - 1], DAG_num)
+
 
+def print_schedules(DAG_deploy, process_sequence, start_time, get_finish_time, DAG_num):
     schedules = [[] for _ in range(para.get_server_num())]
     for func in process_sequence:
         chosen_server = int(DAG_deploy[func - 1])
-        pair = {'func=' + str(func): Event(start=start_time[func - 1], end=T_optimal[func - 1][chosen_server])}
+        pair = {'func=' + str(func): Event(start=start_time[func - 1], end=get_finish_time(func))}
         schedules[chosen_server].append(pair)
     schedules_dict = {}
     for n in range(para.get_server_num()):
@@ -0,0 +1,59 @@
+"""
+Schedule DAGs online by DPE or FixDoc. DAGs arrive one at a time and compete for the same servers, i.e., the
+functions of a DAG can not be processed on a server until the functions of the DAGs arrived before are finished.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import random
+import numpy as np
+from collections import namedtuple
+from embedding.scenario import para
+
+
+# the placement of a DAG, start_time and finish_time are the absolute moments of each function (function i + 1),
+# response_time is the finish time of the slowest function minus arrival_time, queueing_delay is how much of it is
+# spent waiting for the earlier DAGs
+Placement = namedtuple('Placement', 'name arrival_time funcs_deploy start_time finish_time response_time queueing_delay')
+
+
+class OnlineScheduler:
+    def __init__(self, algo, rng=random):
+        """
+        algo is a DPE or FixDoc object, rng is the random number generator used for all the DAGs.
+        """
+        self.algo, self.rng = algo, rng
+        # busy_until[n] is the moment when server n finishes all the functions scheduled on it
+        self.busy_until = np.zeros(para.get_server_num())
+        self.queueing_delay = 0.
+        self.DAG_num = 0
+
+    def submit(self, DAG, arrival_time):
+        """
+        Schedule the DAG (see dag_store.DAG) arrived at arrival_time against the current load of the servers.
+        The queueing delay of the DAG is how much longer its response time is than on idle servers, i.e., how long
+        it waits for the earlier DAGs, which is added up into self.queueing_delay.
+        """
+        server_runtime = np.maximum(self.busy_until - arrival_time, 0)
+        idle_makespan = None
+        if server_runtime.any():
+            # schedule the DAG on idle servers with the same state of rng (e.g., the same paths of FixDoc)
+            state = self.rng.getstate()
+            idle_makespan = self.algo.schedule_DAG(DAG, self.rng, np.zeros(len(server_runtime)))[-1]
+            self.rng.setstate(state)
+        T_optimal, funcs_deploy, _, start_time, makespan = self.algo.schedule_DAG(DAG, self.rng, server_runtime)
+
+        funcs_deploy = funcs_deploy.astype(int)
+        deployed = np.flatnonzero(funcs_deploy >= 0)
+        finish_time = np.full(len(funcs_deploy), np.nan)
+        finish_time[deployed] = arrival_time + T_optimal[deployed, funcs_deploy[deployed]]
+        np.maximum.at(self.busy_until, funcs_deploy[deployed], finish_time[deployed])
+
+        queueing_delay = 0. if idle_makespan is None else max(float(makespan - idle_makespan), 0.)
+        self.queueing_delay += queueing_delay
+        self.DAG_num += 1
+        return Placement(DAG.name, arrival_time, funcs_deploy, arrival_time + start_time, finish_time, makespan,
+                         queueing_delay)
+
+    def reset(self):
+        self.busy_until[:] = 0
+        self.queueing_delay = 0.
+        self.DAG_num = 0
@@ -0,0 +1,86 @@
+"""
+Run an algorithm (DPE, FixDoc or HEFT) over the DAGs of a DAG store, serially or by a pool of worker processes.
+
+Each DAG is scheduled independently against the same scenario by algo.schedule_DAG(DAG, rng). With the 'fork' start
+method, the workers inherit the algorithm object (hence the scenario arrays pp, ratio_arrays, pp_required and
+data_stream) and the memory-mapped DAG store from the parent process without copying.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import random
+import multiprocessing as mp
+from embedding.profiler import NULL_PROFILER
+
+
+# the algorithm, the DAG store and the seed of the pool the process works for
+_algo, _DAG_store, _seed = None, None, None
+
+
+def get_DAG_rng(seed, DAG_id):
+    """
+    Get the random number generator used for the DAG_id-th DAG. The generator only depends on seed and DAG_id,
+    thus a DAG gets the same randomness no matter which process schedules it.
+    Without seed, the global generator of the random module is used (in the order of the DAGs).
+    """
+    if seed is None:
+        return random
+    return random.Random('%d-%d' % (seed, DAG_id))
+
+
+def _init_worker(algo, DAG_store, seed):
+    global _algo, _DAG_store, _seed
+    _algo, _DAG_store, _seed = algo, DAG_store, seed
+
+
+def _schedule_DAG(DAG_id):
+    return DAG_id, _algo.schedule_DAG(_DAG_store.get_DAG(DAG_id), get_DAG_rng(_seed, DAG_id))
+
+
+def get_context():
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    # the scenario and the DAG store are copied into each worker
+    return mp.get_context()
+
+
+def run_DAGs(algo, DAG_store, workers=1, seed=None, DAG_ids=None, profiler=NULL_PROFILER):
+    """
+    Schedule the DAGs of DAG_store (or the DAGs DAG_ids only, each given by its index or its job_name) by algo.
+    Yield (DAG_id, result) in the order of DAG_ids.
+        workers - the number of worker processes, None means one for each CPU
+        seed - the seed of the per-DAG random number generators (see get_DAG_rng())
+        profiler - records each DAG (see profiler.Profiler), the DAGs are scheduled in this process if it is enabled
+
+    When workers > 1, the DAGs are dispatched from the largest to the smallest, thus the large DAGs do not leave
+    workers idle at the end. A seed is drawn from the global generator if it is not given, and the results are the
+    same as a serial run with this seed.
+    """
+    if DAG_ids is None:
+        DAG_ids = range(len(DAG_store))
+    else:
+        DAG_ids = DAG_store.get_DAG_ids(DAG_ids)
+    if workers is None:
+        workers = os.cpu_count()
+    if workers <= 1 or len(DAG_ids) <= 1 or profiler.enabled:
+        for DAG_id in DAG_ids:
+            profiler.begin_DAG(DAG_id, DAG_store.get_DAG_len(DAG_id))
+            profiler.begin('parse')
+            DAG = DAG_store.get_DAG(DAG_id)
+            profiler.end('parse')
+            result = algo.schedule_DAG(DAG, get_DAG_rng(seed, DAG_id))
+            profiler.end_DAG()
+            yield DAG_id, result
+        return
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    dispatch_order = sorted(DAG_ids, key=DAG_store.get_DAG_len, reverse=True)
+    with get_context().Pool(workers, initializer=_init_worker, initargs=(algo, DAG_store, seed)) as pool:
+        # results are buffered until all the DAGs before them have been yielded
+        finished = dict()
+        pos = 0
+        for DAG_id, result in pool.imap_unordered(_schedule_DAG, dispatch_order, chunksize=1):
+            finished[DAG_id] = result
+            while pos < len(DAG_ids) and DAG_ids[pos] in finished:
+                yield DAG_ids[pos], finished.pop(DAG_ids[pos])
+                pos += 1
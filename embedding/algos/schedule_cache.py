@@ -0,0 +1,130 @@
+"""
+Reuse the schedules of structurally identical DAGs by DPE. Many DAGs of the trace have the same structure (e.g., the
+'M1, R2_1' jobs), and with the same costs and the same scenario they get the same schedule, thus it is computed only
+once.
+
+The key of a DAG is the hash of its structure (the functions and their dependencies, in the numbering of the trace)
+and the costs of its functions, together with the fingerprint of the scenario (and of server_runtime if it is
+given). The costs shared by all the DAGs (see scenario.set_funcs()) are a part of the fingerprint.
+
+The cache is for DPE only. FixDoc and HEFT choose the paths at random for each DAG, thus identical DAGs almost never
+get the same schedule and caching them only costs time and evicts the schedules of DPE.
+
+    cache = ScheduleCache(max_size=10000)
+    cached_dpe = CachedAlgo(dpe, cache)
+    for DAG_id, result in run_DAGs(cached_dpe, DAG_store, seed=1): ...
+    print(cache.get_stats())
+
+With workers > 1, each worker process has its own copy of the cache and the statistics are not collected.
+The results of identical DAGs are the same objects, which should not be changed by the caller.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import random
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from embedding.scenario import para, get_DAG_costs
+from embedding.algos.dpe import DPE
+
+
+def get_structure_hash(DAG, pp_required=None, data_stream=None):
+    """
+    Hash the structure of the DAG (and the costs of its functions if they are given). The name of the DAG is not a
+    part of it.
+    """
+    h = hashlib.sha1(repr((DAG.funcs, DAG.parents)).encode())
+    if pp_required is not None:
+        h.update(np.asarray(pp_required, dtype=float).tobytes())
+        h.update(np.asarray(data_stream, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def get_scenario_fingerprint(algo):
+    """
+    Hash the scenario the algorithm works on (the processing power of the servers, the paths between them and the
+    costs shared by the DAGs).
+    """
+    h = hashlib.sha1(type(algo).__name__.encode())
+    h.update(np.array([para.get_server_num(), algo.trace_costs], dtype=np.int64).tobytes())
+    h.update(np.asarray(algo.pp, dtype=float).tobytes())
+    if not algo.trace_costs:
+        h.update(np.asarray(algo.pp_required, dtype=float).tobytes())
+        h.update(np.asarray(algo.data_stream, dtype=float).tobytes())
+    for array in algo.ratio_arrays:
+        h.update(np.asarray(array, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+class ScheduleCache:
+    def __init__(self, max_size=10000):
+        """
+        Keep the results of at most max_size DAGs, the least recently used one is evicted when it is full.
+        """
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, key):
+        """
+        Get the results of key (None if it is not cached).
+        """
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.results),
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.}
+
+    def clear(self):
+        self.results.clear()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+
+class CachedAlgo:
+    def __init__(self, algo, cache=None):
+        """
+        Wrap a DPE object, whose schedule_DAG() looks up cache (a ScheduleCache) firstly.
+        The wrapper can be used wherever the algorithm is used to schedule DAGs, e.g., runner.run_DAGs().
+        """
+        if not isinstance(algo, DPE):
+            raise ValueError('Only the schedules of DPE can be cached, not %s' % type(algo).__name__)
+        self.algo = algo
+        self.cache = ScheduleCache() if cache is None else cache
+        self.fingerprint = get_scenario_fingerprint(algo)
+
+    def get_key(self, DAG, server_runtime):
+        if self.algo.trace_costs:
+            key = [self.fingerprint, get_structure_hash(DAG, *get_DAG_costs(DAG))]
+        else:
+            # the costs are the prefixes of the shared costs, which only depend on the number of functions
+            key = [self.fingerprint, get_structure_hash(DAG)]
+        if server_runtime is not None:
+            key.append(hashlib.sha1(np.asarray(server_runtime, dtype=float).tobytes()).hexdigest())
+        return tuple(key)
+
+    def schedule_DAG(self, DAG, rng=random, server_runtime=None):
+        """
+        Schedule the DAG by DPE, or get the results of an identical DAG from the cache.
+        """
+        key = self.get_key(DAG, server_runtime)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.algo.schedule_DAG(DAG, rng, server_runtime)
+            self.cache.put(key, result)
+        return result
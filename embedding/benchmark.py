@@ -0,0 +1,187 @@
+"""
+Benchmark the scenario generation and DPE, FixDoc and HEFT on synthetic DAGs (see synthetic.py), without the trace.
+
+For each number of servers, the scenario is generated constructively (the path_num cheapest simple paths between
+any two servers are kept) and timed, even if it is already cached (see scenario_cache.py). Then each algorithm
+schedules the DAGs of each shape and size until all of them are scheduled or max_seconds is used up. The DAGs per
+second, the time per function and the peak memory (of scheduling one DAG again under tracemalloc, which is skipped
+if it would exceed max_seconds) are reported and saved as JSON, e.g.,
+    python -m embedding.benchmark --servers 4 16 --sizes 10 100 --output bench.json --baseline old_bench.json
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from embedding.parameters import *
+from embedding.scenario import para
+from embedding.scenario_cache import build_scenario, get_scenario_path, Scenario
+from embedding.synthetic import SHAPES, generate_DAG_store
+from embedding.algos.dpe import DPE
+from embedding.algos.fixdoc import FixDoc
+from embedding.algos.heft import HEFT
+
+
+ALGOS = {'DPE': DPE, 'FixDoc': FixDoc, 'HEFT': HEFT}
+SIZES = [2, 10, 100, 1000, 10000]
+SERVER_NUMS = [4, 16, 64, 256]
+# the number of functions of the DAGs of each case (at least one DAG)
+FUNCS_PER_CASE = 10000
+# tracemalloc slows the scheduling down by up to about this factor
+TRACE_SLOWDOWN = 20
+
+
+def prepare_scenario(server_num, path_num, max_func_num, seed, cache_path=SCENARIO_CACHE_PATH):
+    """
+    Set para for the benchmark and get the scenario. The scenario is always generated and timed, and it is cached
+    if it is absent. Return the scenario (opened from the cache) and the seconds used to generate it.
+    """
+    para.set_server_num(server_num)
+    para.set_path_num(path_num)
+    para.set_max_func_num(max(max_func_num, MAX_FUNC_NUM))
+    start = time.perf_counter()
+    scenario = build_scenario(seed, True)
+    seconds = time.perf_counter() - start
+    scenario_path = get_scenario_path(seed, True, cache_path)
+    if not os.path.exists(scenario_path):
+        scenario.save(scenario_path)
+    return Scenario.load(scenario_path), seconds
+
+
+def time_algo(algo, DAG_store, max_seconds, seed):
+    """
+    Schedule the DAGs of DAG_store one by one until all are scheduled or max_seconds is used up.
+    Return the number of DAGs scheduled, the number of their functions, the seconds used and the seconds used by the
+    first DAG.
+    """
+    rng = random.Random(seed)
+    DAG_num, func_num = 0, 0
+    first_seconds = None
+    start = time.perf_counter()
+    for DAG_id in range(len(DAG_store)):
+        DAG = DAG_store.get_DAG(DAG_id)
+        algo.schedule_DAG(DAG, rng)
+        DAG_num += 1
+        func_num += len(DAG.funcs)
+        if first_seconds is None:
+            first_seconds = time.perf_counter() - start
+        if time.perf_counter() - start > max_seconds:
+            break
+    return DAG_num, func_num, time.perf_counter() - start, first_seconds
+
+
+def trace_peak_memory(algo, DAG_store, seed):
+    """
+    The peak memory (bytes) allocated when scheduling the first DAG of DAG_store.
+    """
+    tracemalloc.start()
+    try:
+        algo.schedule_DAG(DAG_store.get_DAG(0), random.Random(seed))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(algos=ALGOS, shapes=SHAPES, sizes=SIZES, server_nums=SERVER_NUMS, path_num=2, max_seconds=10.,
+                  seed=0, cache_path=SCENARIO_CACHE_PATH):
+    """
+    Run the benchmark cases and return the results as a list of dicts. The settings of para are restored afterwards.
+    """
+    settings = para.get_server_num(), para.get_path_num(), para.get_max_func_num()
+    try:
+        results = []
+        for server_num in server_nums:
+            results.extend(run_cases(algos, shapes, sizes, server_num, path_num, max_seconds, seed, cache_path))
+        return results
+    finally:
+        para.set_server_num(settings[0])
+        para.set_path_num(settings[1])
+        para.set_max_func_num(settings[2])
+
+
+def run_cases(algos, shapes, sizes, server_num, path_num, max_seconds, seed, cache_path):
+    """
+    Run the benchmark cases of server_num servers, the scenario generation firstly.
+    """
+    scenario, seconds = prepare_scenario(server_num, path_num, max(sizes), seed, cache_path)
+    results = [{'kind': 'scenario', 'servers': server_num, 'path_num': path_num, 'seconds': seconds}]
+    print('scenario  servers=%-4d %10.3f s' % (server_num, seconds))
+    args, kwargs = scenario.get_algo_args()
+    for algo_name in algos:
+        algo = ALGOS[algo_name](*args, **kwargs)
+        for shape in shapes:
+            for size in sizes:
+                DAG_store = generate_DAG_store(shape, size, max(1, FUNCS_PER_CASE // size), seed)
+                DAG_num, func_num, seconds, first_seconds = time_algo(algo, DAG_store, max_seconds, seed)
+                # the first DAG is scheduled again under tracemalloc only if it fits in max_seconds
+                peak_memory = None
+                if first_seconds * TRACE_SLOWDOWN <= max_seconds:
+                    peak_memory = trace_peak_memory(algo, DAG_store, seed)
+                result = {'kind': 'algo', 'algo': algo_name, 'shape': shape, 'funcs': size,
+                          'servers': server_num, 'path_num': path_num, 'DAGs': DAG_num, 'seconds': seconds,
+                          'DAGs_per_second': DAG_num / seconds, 'seconds_per_function': seconds / func_num,
+                          'peak_memory': peak_memory}
+                results.append(result)
+                print('%-8s %-15s funcs=%-6d servers=%-4d %10.1f DAGs/s %12.3e s/func %10s KiB' %
+                      (algo_name, shape, size, server_num, result['DAGs_per_second'], result['seconds_per_function'],
+                       '-' if peak_memory is None else '%.1f' % (peak_memory / 1024.)))
+    return results
+
+
+def get_case_key(result):
+    return tuple(result.get(k) for k in ['kind', 'algo', 'shape', 'funcs', 'servers', 'path_num'])
+
+
+def save_results(results, output_path):
+    meta = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform()}
+    with open(output_path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=1)
+
+
+def compare_results(results, baseline_path):
+    """
+    Print the speedup of each case against the results saved in baseline_path (> 1 means faster).
+    """
+    with open(baseline_path) as f:
+        baseline = dict((get_case_key(result), result) for result in json.load(f)['results'])
+    print('\nSpeedup against %s:' % baseline_path)
+    for result in results:
+        old = baseline.get(get_case_key(result))
+        if old is None:
+            continue
+        if result['kind'] == 'scenario':
+            speedup = old['seconds'] / result['seconds']
+        else:
+            speedup = old['seconds_per_function'] / result['seconds_per_function']
+        print('%-50s %8.2fx' % (' '.join(str(k) for k in get_case_key(result) if k is not None), speedup))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark DPE, FixDoc and HEFT on synthetic DAGs.')
+    parser.add_argument('--algos', nargs='+', default=list(ALGOS), choices=list(ALGOS))
+    parser.add_argument('--shapes', nargs='+', default=SHAPES, choices=SHAPES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--servers', nargs='+', type=int, default=SERVER_NUMS)
+    parser.add_argument('--path-num', type=int, default=2)
+    parser.add_argument('--max-seconds', type=float, default=10.)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='the results of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.algos, args.shapes, args.sizes, args.servers, args.path_num, args.max_seconds,
+                            args.seed)
+    save_results(results, args.output)
+    print('Results are saved in %s' % args.output)
+    if args.baseline is not None:
+        compare_results(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,129 @@
+"""
+Compare the algorithms on the same DAGs in one pass. Each DAG is read and parsed from the DAG store once and then
+scheduled by every algorithm, whose results are converted into the common Schedule (see result_store.py). The
+makespan and the seconds used by each algorithm on each DAG are collected into a table, e.g.,
+    python -m embedding.compare --seed 1 --algos DPE FixDoc HEFT --output comparison.csv
+
+An algorithm is registered with register_algo(name, algo_class, to_schedule), where to_schedule(result, DAG) converts
+the result of algo.schedule_DAG(DAG, rng) into a Schedule.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import sys
+import time
+import random
+import argparse
+import pandas as pd
+from embedding.parameters import *
+from embedding.dag_store import load_DAG_store
+from embedding.scenario_cache import load_scenario
+from embedding.result_store import get_schedule, get_HEFT_schedule
+from embedding.algos.runner import run_DAGs
+from embedding.algos.dpe import DPE
+from embedding.algos.fixdoc import FixDoc
+from embedding.algos.heft import HEFT
+
+
+# the registered algorithms, name -> (algo_class, to_schedule)
+ALGOS = dict()
+
+
+def register_algo(name, algo_class, to_schedule):
+    ALGOS[name] = (algo_class, to_schedule)
+
+
+def to_schedule(result, DAG):
+    return get_schedule(*result)
+
+
+def HEFT_to_schedule(result, DAG):
+    return get_HEFT_schedule(*result, len(DAG.funcs))
+
+
+register_algo('DPE', DPE, to_schedule)
+register_algo('FixDoc', FixDoc, to_schedule)
+register_algo('HEFT', HEFT, HEFT_to_schedule)
+
+
+class Comparison:
+    def __init__(self, algos):
+        """
+        algos maps the names of registered algorithms to the algorithm objects.
+        """
+        for name in algos:
+            if name not in ALGOS:
+                raise ValueError('Unknown algorithm: %s' % name)
+        self.algos = algos
+
+    def schedule_DAG(self, DAG, rng=random):
+        """
+        Schedule the DAG by each algorithm. Each algorithm starts from the same state of rng, thus it gets the same
+        results as scheduling the DAG alone. Return a dict mapping the name of each algorithm to the Schedule and
+        the seconds used.
+        """
+        state = rng.getstate()
+        results = dict()
+        for name, algo in self.algos.items():
+            rng.setstate(state)
+            start = time.perf_counter()
+            result = algo.schedule_DAG(DAG, rng)
+            seconds = time.perf_counter() - start
+            results[name] = (ALGOS[name][1](result, DAG), seconds)
+        return results
+
+
+def iter_comparison(algos, DAG_store, workers=1, seed=None, DAG_ids=None):
+    """
+    Schedule the DAGs of DAG_store (or the DAGs DAG_ids only) by all the algorithms. Yield (DAG_id, results) in the
+    order of DAG_ids, where results is the output of Comparison.schedule_DAG() (see runner.run_DAGs() for workers
+    and seed).
+    """
+    return run_DAGs(Comparison(algos), DAG_store, workers=workers, seed=seed, DAG_ids=DAG_ids)
+
+
+def compare_algos(algos, DAG_store, workers=1, seed=None, DAG_ids=None):
+    """
+    Get the comparison table, one row for each DAG: its index, job_name, number of functions, and the makespan and
+    seconds of each algorithm (columns '<name>_makespan' and '<name>_seconds').
+    """
+    rows = []
+    for DAG_id, results in iter_comparison(algos, DAG_store, workers, seed, DAG_ids):
+        row = {'DAG_id': DAG_id, 'job_name': str(DAG_store.job_names[DAG_id]),
+               'funcs': DAG_store.get_DAG_len(DAG_id)}
+        for name, (schedule, seconds) in results.items():
+            row[name + '_makespan'] = schedule.makespan
+            row[name + '_seconds'] = seconds
+        rows.append(row)
+    columns = ['DAG_id', 'job_name', 'funcs'] + [name + suffix for name in algos for suffix in ['_makespan', '_seconds']]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def print_comparison(table, algo_names):
+    print('%-10s %18s %18s %18s' % ('algorithm', 'overall makespan', 'average makespan', 'scheduler seconds'))
+    for name in algo_names:
+        makespans = table[name + '_makespan']
+        print('%-10s %18f %18f %18f' % (name, makespans.sum(), makespans.mean(), table[name + '_seconds'].sum()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the algorithms on the same DAGs in one pass.')
+    parser.add_argument('--algos', nargs='+', default=list(ALGOS), choices=list(ALGOS))
+    parser.add_argument('--sorted-DAG-path', default=SORTED_DAG_PATH)
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the scenario and of the DAGs')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', default='comparison.csv')
+    args = parser.parse_args(argv)
+
+    DAG_store = load_DAG_store(args.sorted_DAG_path)
+    if DAG_store is None:
+        print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+        return
+    algo_args, algo_kwargs = load_scenario(args.seed).get_algo_args()
+    algos = dict((name, ALGOS[name][0](*algo_args, **algo_kwargs)) for name in args.algos)
+    table = compare_algos(algos, DAG_store, args.workers, args.seed)
+    table.to_csv(args.output, index=0)
+    print_comparison(table, args.algos)
+    print('The comparison of %d DAGs is saved in %s' % (len(table), args.output))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,307 @@
+"""
+Compile the sorted DAGs (topological_order.csv) into a compact binary store, which is shared by DPE, FixDoc and HEFT.
+
+The store is a directory of .npy files opened with memory-mapping:
+    offsets          the first row of each DAG, followed by the number of rows,
+    job_names        the job_name of each DAG,
+    funcs            the number of the function of each row, e.g., 13 for 'R13_2_3_12',
+    parent_offsets,
+    parents          the functions each row depends on (CSR), e.g., [2, 3, 12] for 'R13_2_3_12',
+    child_offsets,
+    children         the functions which depend on function i + 1 of each DAG (CSR), in row order,
+    pp_required,
+    data_stream      the processing power required and the output data stream size of the function of each row,
+                     derived from the trace columns and normalized into [0, 1] (empty if the columns are absent, see
+                     get_func_costs()),
+    job_name_order   the DAGs sorted by job_name, which indexes the DAGs by job_name,
+    version          the format version of the store (STORE_VERSION), a store of another version is recompiled.
+Rows are the rows of topological_order.csv, thus the functions of each DAG are in topological order.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from embedding.utils import get_DAG_begins
+from embedding.parameters import *
+
+
+# funcs[j] is the number of the j-th function, parents[j] is the list of functions it depends on,
+# children[i] is the list of functions which depend on function i + 1 and rows[f] is the first row of function f,
+# pp_required[j] and data_stream[j] are the normalized costs of the j-th function (None if they are unknown)
+DAG = namedtuple('DAG', 'name funcs parents children rows pp_required data_stream', defaults=(None, None))
+
+STORE_ARRAYS = ['offsets', 'job_names', 'funcs', 'parent_offsets', 'parents', 'child_offsets', 'children',
+                'pp_required', 'data_stream', 'job_name_order']
+# bumped whenever the arrays of the store change
+STORE_VERSION = 2
+# the columns of the trace the costs of the functions are derived from
+COST_COLUMNS = ['instance_num', 'start_time', 'end_time', 'plan_cpu', 'plan_mem']
+
+
+def parse_task_names(task_names):
+    """
+    Parse task names such as 'R13_2_3_12' in one vectorized pass.
+    Return the number of each function and the functions it depends on in CSR form (parent_offsets, parents).
+    """
+    parts = pd.Series(task_names, dtype=str).str.strip().str.split('_').explode()
+    rows = parts.index.to_numpy()
+    is_head = np.ones(len(parts), dtype=bool)
+    is_head[1:] = rows[1:] != rows[:-1]
+
+    heads = parts[is_head]
+    funcs = heads.str[1:].astype(np.int64).to_numpy(dtype=np.int32)
+    # empty strings (e.g., 'J30_4_5_') are not dependencies
+    is_parent = ~is_head & parts.str.isnumeric().to_numpy(dtype=bool)
+    parents = parts[is_parent].astype(np.int64).to_numpy(dtype=np.int32)
+    parent_offsets = np.zeros(len(funcs) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[is_parent], minlength=len(funcs)), out=parent_offsets[1:])
+    return funcs, parent_offsets, parents
+
+
+def normalize(values):
+    """
+    Normalize values into [0, 1] on log scale. The missing values are given the median.
+    """
+    values = np.asarray(values, dtype=float)
+    known = np.isfinite(values)
+    if not known.any():
+        return np.full(len(values), 0.5)
+    values = np.log1p(np.maximum(np.where(known, values, np.median(values[known])), 0))
+    span = values.max() - values.min()
+    if span == 0:
+        return np.full(len(values), 0.5)
+    return (values - values.min()) / span
+
+
+def get_func_costs(df):
+    """
+    Derive the costs of the function of each row from the trace columns in one vectorized pass:
+        the processing power required grows with the CPU time, plan_cpu * instance_num * runtime,
+        the output data stream size grows with the memory, plan_mem * instance_num.
+    Both are normalized into [0, 1], the algorithms scale them into the ranges of para (see scenario.get_DAG_costs()).
+    Return two empty arrays if the columns are absent (e.g., synthetic DAGs).
+    """
+    if not all(column in df.columns for column in COST_COLUMNS):
+        return np.zeros(0), np.zeros(0)
+    instance_num = df['instance_num'].to_numpy(dtype=float)
+    runtime = np.maximum(df['end_time'].to_numpy(dtype=float) - df['start_time'].to_numpy(dtype=float), 1)
+    cpu_time = df['plan_cpu'].to_numpy(dtype=float) / 100. * instance_num * runtime
+    memory = df['plan_mem'].to_numpy(dtype=float) * instance_num
+    return normalize(cpu_time), normalize(memory)
+
+
+class DAGStore:
+    def __init__(self, offsets, job_names, funcs, parent_offsets, parents, child_offsets, children, pp_required,
+                 data_stream, job_name_order):
+        self.offsets, self.job_names = offsets, job_names
+        self.funcs = funcs
+        self.parent_offsets, self.parents = parent_offsets, parents
+        self.child_offsets, self.children = child_offsets, children
+        self.pp_required, self.data_stream = pp_required, data_stream
+        self.job_name_order = job_name_order
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_DAG(i)
+
+    def get_DAG_len(self, i):
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def get_rows(self, i):
+        """
+        Get the range of the rows of the i-th DAG in topological_order.csv (the header excluded).
+        """
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def get_DAG_id(self, job_name):
+        """
+        Get the index of the DAG of job_name by binary search over job_name_order.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if str(self.job_names[self.job_name_order[mid]]) < job_name:
+                low = mid + 1
+            else:
+                high = mid
+        if low == len(self) or str(self.job_names[self.job_name_order[low]]) != job_name:
+            raise KeyError('No DAG of job_name %s' % job_name)
+        return int(self.job_name_order[low])
+
+    def get_DAG_ids(self, keys):
+        """
+        Get the indices of the DAGs, each given by its index or its job_name.
+        """
+        DAG_ids = []
+        for key in keys:
+            if isinstance(key, str):
+                DAG_ids.append(self.get_DAG_id(key))
+            elif -len(self) <= key < len(self):
+                DAG_ids.append(int(key) % len(self))
+            else:
+                raise IndexError('DAG index %d out of range' % key)
+        return DAG_ids
+
+    def get_DAG(self, i):
+        """
+        Get the i-th DAG as python lists.
+        """
+        begin, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        funcs = self.funcs[begin: end].tolist()
+        parents = DAGStore.split(self.parent_offsets[begin: end + 1], self.parents)
+        children = DAGStore.split(self.child_offsets[begin: end + 1], self.children)
+        rows = dict()
+        for j in range(len(funcs) - 1, -1, -1):
+            rows[funcs[j]] = j
+        if len(self.pp_required) == 0:
+            return DAG(str(self.job_names[i]), funcs, parents, children, rows)
+        return DAG(str(self.job_names[i]), funcs, parents, children, rows, self.pp_required[begin: end],
+                   self.data_stream[begin: end])
+
+    @staticmethod
+    def split(offsets, values):
+        """
+        Split the CSR values between offsets[0] and offsets[-1] into python lists.
+        """
+        begin, end = int(offsets[0]), int(offsets[-1])
+        flat = values[begin: end].tolist()
+        bounds = (offsets - begin).tolist()
+        return [flat[bounds[k]: bounds[k + 1]] for k in range(len(bounds) - 1)]
+
+    def save(self, store_path):
+        """
+        Save the store into the directory store_path. The directory is replaced as a whole.
+        """
+        tmp_path = store_path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name in STORE_ARRAYS:
+            np.save(os.path.join(tmp_path, name + '.npy'), getattr(self, name))
+        np.save(os.path.join(tmp_path, 'version.npy'), np.array(STORE_VERSION))
+        if os.path.exists(store_path):
+            shutil.rmtree(store_path)
+        os.rename(tmp_path, store_path)
+
+    @staticmethod
+    def load(store_path, mmap_mode='r'):
+        """
+        Open the store saved in the directory store_path with memory-mapping.
+        """
+        version = get_store_version(store_path)
+        if version != STORE_VERSION:
+            raise ValueError('The DAG store %s is of version %s instead of %d, please compile it again'
+                             % (store_path, version, STORE_VERSION))
+        return DAGStore(*[np.load(os.path.join(store_path, name + '.npy'), mmap_mode=mmap_mode)
+                          for name in STORE_ARRAYS])
+
+
+def build_DAG_store(df):
+    """
+    Build the store from the sorted DAGs (a DataFrame in the layout of topological_order.csv).
+    """
+    offsets = get_DAG_begins(df['job_name'].to_numpy()).astype(np.int64)
+    job_names = df['job_name'].to_numpy()[offsets[:-1]].astype(str)
+    funcs, parent_offsets, parents = parse_task_names(df['task_name'].to_numpy())
+
+    # the child slot of the edge 'row j depends on p' is the p-th function of the DAG of row j
+    DAG_lens = np.diff(offsets)
+    rows = np.repeat(np.arange(len(funcs)), np.diff(parent_offsets))
+    DAG_begins = np.repeat(offsets[:-1], DAG_lens)[rows]
+    DAG_ends = np.repeat(offsets[1:], DAG_lens)[rows]
+    slots = DAG_begins + parents.astype(np.int64) - 1
+    valid = (slots >= DAG_begins) & (slots < DAG_ends)
+    slots, rows = slots[valid], rows[valid]
+    # the stable sort keeps the children of each slot in row order
+    order = np.argsort(slots, kind='stable')
+    children = funcs[rows[order]]
+    child_offsets = np.zeros(len(funcs) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(slots, minlength=len(funcs)), out=child_offsets[1:])
+
+    pp_required, data_stream = get_func_costs(df)
+    job_name_order = np.argsort(job_names, kind='stable')
+    return DAGStore(offsets, job_names, funcs, parent_offsets, parents, child_offsets, children, pp_required,
+                    data_stream, job_name_order)
+
+
+def make_DAG(task_names, name=''):
+    """
+    Build a DAG from the task names of its functions (in topological order) directly, e.g., for a DAG submitted
+    online. The DAG is the same as it would be in the store.
+    """
+    funcs, parents = [], []
+    for task_name in task_names:
+        parts = task_name.strip().split('_')
+        funcs.append(int(parts[0][1:]))
+        parents.append([int(p) for p in parts[1:] if p.isnumeric()])
+    children = [[] for _ in funcs]
+    for j in range(len(funcs)):
+        for p in parents[j]:
+            if 0 < p <= len(funcs):
+                children[p - 1].append(funcs[j])
+    rows = dict()
+    for j in range(len(funcs) - 1, -1, -1):
+        rows[funcs[j]] = j
+    return DAG(name, funcs, parents, children, rows)
+
+
+def get_store_path(sorted_DAG_path):
+    return os.path.splitext(sorted_DAG_path)[0] + '.store'
+
+
+def get_store_version(store_path):
+    """
+    Get the format version of the store, None if the store is absent or has no version.
+    """
+    version_path = os.path.join(store_path, 'version.npy')
+    if not os.path.exists(version_path):
+        return None
+    return int(np.load(version_path))
+
+
+def is_compiled(sorted_DAG_path, store_path):
+    """
+    The store is up to date if it is of the current version and newer than the sorted DAGs.
+    """
+    if get_store_version(store_path) != STORE_VERSION:
+        return False
+    if not os.path.exists(sorted_DAG_path):
+        return True
+    return os.path.getmtime(os.path.join(store_path, 'offsets.npy')) >= os.path.getmtime(sorted_DAG_path)
+
+
+def compile_DAG_store(sorted_DAG_path=SORTED_DAG_PATH, store_path=None):
+    """
+    Compile the sorted DAGs into the binary store. This only needs to be done once for a topological_order.csv.
+    """
+    if store_path is None:
+        store_path = get_store_path(sorted_DAG_path)
+    if is_compiled(sorted_DAG_path, store_path):
+        print('DAGs have been compiled!')
+        return
+
+    if not os.path.exists(sorted_DAG_path):
+        print('DAGs\' topological order has not been obtained! Please get topological order firstly.')
+        return
+
+    print('Compiling DAGs into %s ...' % store_path)
+    build_DAG_store(pd.read_csv(sorted_DAG_path)).save(store_path)
+
+
+def load_DAG_store(sorted_DAG_path=SORTED_DAG_PATH, store_path=None):
+    """
+    Open the binary store of the sorted DAGs, compile it firstly if it is absent or out of date.
+    Return None if neither the store nor the sorted DAGs exist.
+    """
+    if store_path is None:
+        store_path = get_store_path(sorted_DAG_path)
+    if not is_compiled(sorted_DAG_path, store_path):
+        if not os.path.exists(sorted_DAG_path):
+            return None
+        build_DAG_store(pd.read_csv(sorted_DAG_path)).save(store_path)
+    return DAGStore.load(store_path)
@@ -12,16 +12,18 @@ batch_task.csv.
     Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
 """
 import os
+import heapq
 import numpy as np
 import pandas as pd
-from embedding.utils import ProgressBar
+from embedding.utils import ProgressBar, get_DAG_begins
+from embedding.dag_store import parse_task_names, DAGStore
 from embedding.parameters import *
 
 
 bar = ProgressBar()
 
 
-def sample_DAG(dataset_path=DATASET_PATH, selected_data_path=SELECTED_DAG_PATH):
+def sample_DAG(dataset_path=DATASET_PATH, selected_data_path=SELECTED_DAG_PATH, chunk_size=CHUNK_SIZE):
     """
     Select 200 DAGs with number of functions being 2;
     800 DAGs with number of functions between 3 and 10;
@@ -29,6 +31,10 @@ def sample_DAG(dataset_path=DATASET_PATH, selected_data_path=SELECTED_DAG_PATH):
     400 DAGs with number of functions between 51 and 100;
     119 DAGs with functions more than 100.
 
+    batch_task.csv is streamed in chunks of chunk_size rows, thus the memory used does not grow with the size of
+    the trace. The rows of a DAG are consecutive rows with the same job_name, a DAG cut by the border of a chunk is
+    carried over to the next chunk. The sampling stops as soon as every bucket is full.
+
     The selected DAGs are saved in selected_DAGs.csv.
     """
     if os.path.exists(selected_data_path):
@@ -41,63 +47,83 @@ def sample_DAG(dataset_path=DATASET_PATH, selected_data_path=SELECTED_DAG_PATH):
               'and uncompress it into the dataset dir.')
         return
 
-    # download online and get data (rewrite)
-    df = pd.read_csv(dataset_path, header=None)
-    df.columns = ['task_name', 'instance_num', 'job_name', 'task_type', 'status',
-                  'start_time', 'end_time', 'plan_cpu', 'plan_mem']
-    print(df.describe)
-
-    df_len = df.shape[0]
-    required_num = REQUIRED_NUM
-    counters = np.zeros(5)
-    idx = 0
+    required_num = np.array(REQUIRED_NUM)
+    counters = np.zeros(len(required_num), dtype=int)
 
-    DAGs = df.loc[0: 0]
+    # write into a temporary file, thus an interrupted sampling is not taken as finished
+    tmp_path = selected_data_path + '.tmp'
+    header = True
+    pending = None
     print('DAGs are sampling ...')
-    while idx < df_len:
-        task_name = df.loc[idx, 'task_name']
-        if task_name.find('task_') != -1:
-            idx = idx + 1
-            continue
-
-        DAG_name = df.loc[idx, 'job_name']
-        DAG_len = 0
-        while (idx + DAG_len < df_len) and (df.loc[idx + DAG_len, 'job_name'] == DAG_name):
-            DAG_len = DAG_len + 1
-        if DAG_len == 2:
-            if counters[0] < required_num[0]:
-                DAGs = pd.concat([DAGs, df.loc[idx: idx + DAG_len - 1].copy()], axis=0)
-                counters[0] = counters[0] + 1
-        elif 3 <= DAG_len <= 10:
-            if counters[1] < required_num[1]:
-                DAGs = pd.concat([DAGs, df.loc[idx: idx + DAG_len - 1].copy()], axis=0)
-                counters[1] = counters[1] + 1
-        elif 11 <= DAG_len <= 50:
-            if counters[2] < required_num[2]:
-                DAGs = pd.concat([DAGs, df.loc[idx: idx + DAG_len - 1].copy()], axis=0)
-                counters[2] = counters[2] + 1
-        elif 51 <= DAG_len <= 100:
-            if counters[3] < required_num[3]:
-                DAGs = pd.concat([DAGs, df.loc[idx: idx + DAG_len - 1].copy()], axis=0)
-                counters[3] = counters[3] + 1
-        elif DAG_len > 100:
-            if counters[4] < required_num[4]:
-                DAGs = pd.concat([DAGs, df.loc[idx: idx + DAG_len - 1].copy()], axis=0)
-                counters[4] = counters[4] + 1
-        idx = idx + DAG_len
-
-        percent = sum(counters) / float(sum(required_num)) * 100
-        bar.update(percent)
-
-        if (sum(counters) == all):
+    reader = pd.read_csv(dataset_path, header=None, names=TRACE_COLUMNS, chunksize=chunk_size)
+    for chunk in reader:
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        # the last DAG of the chunk may continue in the next chunk
+        DAG_begins = get_DAG_begins(chunk['job_name'].to_numpy())
+        pending = chunk.iloc[DAG_begins[-2]:]
+        selected = select_DAGs(chunk, DAG_begins[:-2], DAG_begins[1:-1], counters, required_num)
+        if len(selected) > 0:
+            chunk.iloc[selected].to_csv(tmp_path, index=0, header=header, mode='w' if header else 'a')
+            header = False
+
+        bar.update(min(counters.sum() / float(required_num.sum()) * 100, 100))
+        if (counters >= required_num).all():
+            pending = None
             break
+    reader.close()
+
+    if pending is not None and len(pending) > 0:
+        # the last DAG of the trace
+        pending = pending.reset_index(drop=True)
+        selected = select_DAGs(pending, np.array([0]), np.array([len(pending)]), counters, required_num)
+        if len(selected) > 0:
+            pending.iloc[selected].to_csv(tmp_path, index=0, header=header, mode='w' if header else 'a')
+            header = False
+        bar.update(min(counters.sum() / float(required_num.sum()) * 100, 100))
 
-    DAGs.to_csv(selected_data_path, index=0)
+    if header:
+        # no DAG is selected, still write the header
+        pd.DataFrame(columns=TRACE_COLUMNS).to_csv(tmp_path, index=0)
+    os.replace(tmp_path, selected_data_path)
+
+
+def select_DAGs(chunk, begins, ends, counters, required_num):
+    """
+    Select the DAGs (rows begins[i] to ends[i] - 1 of the chunk) whose buckets are not full yet and update counters
+    in place. The leading independent tasks (named like 'task_xxx') of each job are skipped.
+    Return the rows of the selected DAGs.
+    """
+    if len(begins) == 0:
+        return np.zeros(0, dtype=int)
+    # the first row which is not an independent task of each job
+    is_task = chunk['task_name'].astype(str).str.contains('task_', regex=False).to_numpy()
+    positions = np.where(is_task, len(chunk), np.arange(len(chunk)))
+    firsts = np.minimum.reduceat(positions[:ends[-1]], begins)
+    DAG_lens = np.maximum(ends - firsts, 0)
+
+    # DAGs with only one function do not belong to any bucket
+    buckets = np.searchsorted(DAG_SIZE_BOUNDS, DAG_lens, side='right') - 1
+    chosen = np.zeros(len(begins), dtype=bool)
+    for b in range(len(required_num)):
+        in_bucket = np.flatnonzero(buckets == b)
+        taken = in_bucket[:max(required_num[b] - counters[b], 0)]
+        chosen[taken] = True
+        counters[b] += len(taken)
+
+    firsts, DAG_lens = firsts[chosen], DAG_lens[chosen]
+    if len(firsts) == 0:
+        return np.zeros(0, dtype=int)
+    # concatenate the row ranges of the chosen DAGs
+    offsets = np.repeat(firsts - np.cumsum(DAG_lens) + DAG_lens, DAG_lens)
+    return offsets + np.arange(DAG_lens.sum())
 
 
 def get_topological_order(selected_DAG_path=SELECTED_DAG_PATH, sorted_DAG_path=SORTED_DAG_PATH):
     """
     Get the topoligical ordering of each DAG, sabe the results into the file topological_order.csv.
+    The task names of all DAGs are parsed in one vectorized pass, then each DAG is sorted by topological_sort()
+    and the sorted rows are written in one bulk operation.
     """
     if os.path.exists(sorted_DAG_path):
         print('DAGs\' topological order has been obtained!')
@@ -108,72 +134,69 @@ def get_topological_order(selected_DAG_path=SELECTED_DAG_PATH, sorted_DAG_path=S
         return
 
     df = pd.read_csv(selected_DAG_path)
-    df_len = df.shape[0]
-    idx = 0
+    DAG_begins = get_DAG_begins(df['job_name'].to_numpy())
+    all_DAG_num = len(DAG_begins) - 1
 
-    required_num = REQUIRED_NUM
-    all_DAG_num = sum(required_num)
-    sorted_num = 0
+    # get the number and dependencies of each function of all DAGs
+    funcs, parent_offsets, parents = parse_task_names(df['task_name'].to_numpy())
+    funcs = funcs.tolist()
+    parents = DAGStore.split(parent_offsets, parents)
 
     print('Getting topological order for %d DAGs...' % all_DAG_num)
-    while idx < df_len:
-        # get a DAG
-        DAG_name = df.loc[idx, 'job_name']
-        DAG_len = 0
-        while (idx + DAG_len < df_len) and (df.loc[idx + DAG_len, 'job_name'] == DAG_name):
-            DAG_len = DAG_len + 1
-        DAG = df.loc[idx: idx + DAG_len].copy()
-
-        # get the number and dependencies of each function of the DAG
-        funcs_num = np.zeros(DAG_len)
-        dependencies = [[] * 1] * DAG_len
-        for i in range(DAG_len):
-            name_str_list = DAG.loc[i + idx, 'task_name'].split('_')
-            name_str_list_len = len(name_str_list)
-            func_str_len = len(name_str_list[0])
-            func_num = int(name_str_list[0][1:func_str_len])
-            dependent_funcs = []
-            for j in range(name_str_list_len):
-                if j == 0:
-                    # the func itself
-                    continue
-                if name_str_list[j].isnumeric():
-                    # the func's dependencies
-                    dependent_func_num = int(name_str_list[j])
-                    dependent_funcs.append(dependent_func_num)
-            funcs_num[i] = func_num
-            dependencies[i] = dependent_funcs
-
-        # sort the functions accroding to their dependencies
-        funcs_left = DAG_len
-        DAG_sorted = DAG.copy()
-        while funcs_left > 0:
-            # find a source func, and place the funcs who depend on it after this source func
-            # the topological ordering we take is actually a Depth-first Search algorithm
-            # as a result, the entry functions may not have the smallest number
-
-            # ==== this is where we can improved ====
-            # Use Breadth-first Search algorithm to optain the topological ordering and compare the results.
-            # The makespan might be decreased further.
-            # =======================================
-            for i in range(len(dependencies)):
-                if len(dependencies[i]) == 0:
-                    running_func = i
-                    dependencies[i].append(-1)
-                    break
-            func_running = int(funcs_num[running_func])
-            for i in range(len(dependencies)):
-                if dependencies[i].count(func_running) > 0:
-                    dependencies[i].remove(func_running)
-            DAG_sorted.loc[DAG_len - funcs_left + idx] = DAG.loc[running_func + idx].copy()
-            funcs_left = funcs_left - 1
-        df.loc[idx: idx + DAG_len - 1] = DAG_sorted.copy()
-        idx = idx + DAG_len
-        sorted_num = sorted_num + 1
-        percent = sorted_num / float(all_DAG_num) * 100
-        # for overflow
-        if percent > 100:
-            percent = 100
-        bar.update(percent)
-
-    df.to_csv(sorted_DAG_path, index=0)
+    sorted_rows = []
+    for d in range(all_DAG_num):
+        begin, end = DAG_begins[d], DAG_begins[d + 1]
+        order = topological_sort(funcs[begin: end], parents[begin: end])
+        sorted_rows.extend(begin + i for i in order)
+        bar.update((d + 1) / float(all_DAG_num) * 100)
+
+    df.iloc[sorted_rows].to_csv(sorted_DAG_path, index=0)
+
+
+def topological_sort(funcs, parents):
+    """
+    Sort the functions of a DAG with Kahn's algorithm, where funcs[i] is the number of the i-th function and
+    parents[i] is the list of functions it depends on. Return the order of the functions (by their positions).
+
+    Among the functions whose dependencies are all sorted, the first one in the DAG is picked, thus the result is the
+    same as repeatedly picking the first function without unsorted dependencies.
+    As a result, the entry functions may not have the smallest number.
+
+    ==== this is where we can improved ====
+    Use Breadth-first Search algorithm to optain the topological ordering and compare the results.
+    The makespan might be decreased further.
+    =======================================
+    """
+    # in_degree[i] is the number of unsorted dependencies of function i,
+    # waiting[f] records how many times each function depends on the function numbered f
+    in_degree = [len(p) for p in parents]
+    waiting = {}
+    for i in range(len(funcs)):
+        for f in parents[i]:
+            dependents = waiting.setdefault(f, {})
+            dependents[i] = dependents.get(i, 0) + 1
+
+    # the positions are pushed in increasing order, thus ready is a valid heap
+    ready = [i for i in range(len(funcs)) if in_degree[i] == 0]
+    order = []
+    while ready:
+        running_func = heapq.heappop(ready)
+        order.append(running_func)
+        # each function numbered funcs[running_func] satisfies one dependency of its dependents
+        dependents = waiting.get(funcs[running_func])
+        if not dependents:
+            continue
+        for i in list(dependents):
+            if dependents[i] == 1:
+                del dependents[i]
+            else:
+                dependents[i] -= 1
+            in_degree[i] -= 1
+            if in_degree[i] == 0:
+                heapq.heappush(ready, i)
+
+    if len(order) < len(funcs):
+        # the DAG has a cycle or depends on a missing function, keep the unsorted functions as they are
+        sorted_funcs = set(order)
+        order.extend(i for i in range(len(funcs)) if i not in sorted_funcs)
+    return order
@@ -0,0 +1,259 @@
+"""
+Check that an alternative engine (e.g., parallel or cached) gets the same placements and makespans as the reference
+implementations of DPE, FixDoc and HEFT.
+
+Firstly, the reference engine schedules the DAG sets (synthetic DAGs of each shape, see synthetic.py, and DAGs sampled
+from the DAG store) with fixed seeds, and the results are recorded as golden files, i.e., a result store (see
+result_store.py) for each algorithm, DAG set and seed, together with golden.json (the cases, the seconds used and the
+hash of the parameters, golden files recorded with other parameters are refused).
+Then an engine schedules the same DAGs and its results are checked against the golden files: the placements exactly,
+the start times, the finish times and the makespans within tolerance (exactly if it is 0). The verdict and the seconds
+of each case (the best of a few repeated runs) are reported, together with the overall speedup against the reference
+(the cases of a few milliseconds are too noisy for a speedup of their own), e.g.,
+    python -m embedding.equivalence record --golden golden
+    python -m embedding.equivalence check --golden golden --engine parallel --tolerance 1e-9
+
+An engine is registered with register_engine(name, run), where run(algo, DAG_store, DAG_ids, seed) yields
+(DAG_id, result) like runner.run_DAGs().
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from embedding.parameters import *
+from embedding.scenario import para
+from embedding.dag_store import load_DAG_store, build_DAG_store
+from embedding.scenario_cache import load_scenario, get_parameter_hash
+from embedding.synthetic import SHAPES, generate_DAGs
+from embedding.result_store import ResultWriter, ResultStore, FUNC_COLUMNS
+from embedding.compare import ALGOS
+from embedding.algos.runner import run_DAGs
+from embedding.algos.dpe import DPE
+from embedding.algos.schedule_cache import CachedAlgo
+
+
+SEEDS = [1, 2, 3]
+# the sizes of the synthetic DAGs, at most MAX_FUNC_NUM functions (see scenario.set_funcs())
+SYNTHETIC_SIZES = [1, 2, 10, 50, 250]
+SYNTHETIC_DAG_NUM = 4
+SAMPLED_DAG_NUM = 500
+# each case is timed by the best of REPEATS runs
+REPEATS = 5
+
+# the registered engines, name -> run
+ENGINES = dict()
+
+
+def register_engine(name, run):
+    ENGINES[name] = run
+
+
+def run_reference(algo, DAG_store, DAG_ids, seed):
+    return run_DAGs(algo, DAG_store, seed=seed, DAG_ids=DAG_ids)
+
+
+def run_parallel(algo, DAG_store, DAG_ids, seed):
+    return run_DAGs(algo, DAG_store, workers=None, seed=seed, DAG_ids=DAG_ids)
+
+
+def run_cached(algo, DAG_store, DAG_ids, seed):
+    # the schedules of DPE only are cached (see schedule_cache.py)
+    if isinstance(algo, DPE):
+        algo = CachedAlgo(algo)
+    return run_DAGs(algo, DAG_store, seed=seed, DAG_ids=DAG_ids)
+
+
+register_engine('reference', run_reference)
+register_engine('parallel', run_parallel)
+register_engine('cached', run_cached)
+
+
+def get_DAG_sets(shapes=SHAPES, sizes=SYNTHETIC_SIZES, sampled_DAG_num=SAMPLED_DAG_NUM,
+                 sorted_DAG_path=SORTED_DAG_PATH, seed=0):
+    """
+    Get the DAG sets as a dict mapping the name of each set to (DAG_store, DAG_ids): a set of synthetic DAGs of each
+    shape, and the 'sampled' set of sampled_DAG_num DAGs evenly spaced in the DAG store (if it exists).
+    """
+    DAG_sets = dict()
+    for shape in shapes:
+        df = pd.concat([generate_DAGs(shape, size, SYNTHETIC_DAG_NUM, seed) for size in sizes], ignore_index=True)
+        DAG_store = build_DAG_store(df)
+        DAG_sets[shape] = (DAG_store, list(range(len(DAG_store))))
+    DAG_store = load_DAG_store(sorted_DAG_path) if sampled_DAG_num > 0 else None
+    if DAG_store is not None:
+        DAG_ids = np.unique(np.linspace(0, len(DAG_store) - 1, min(sampled_DAG_num, len(DAG_store))).astype(int))
+        DAG_sets['sampled'] = (DAG_store, DAG_ids.tolist())
+    return DAG_sets
+
+
+def get_case_name(algo_name, DAG_set_name, seed):
+    return '%s-%s-%d' % (algo_name, DAG_set_name, seed)
+
+
+def time_results(results, consume):
+    """
+    Pass each (DAG_id, result) of results to consume. Return the seconds used to get the results (consume is out of
+    the timing).
+    """
+    results = iter(results)
+    seconds = 0.
+    while True:
+        start = time.perf_counter()
+        item = next(results, None)
+        seconds += time.perf_counter() - start
+        if item is None:
+            return seconds
+        consume(*item)
+
+
+def run_case(engine, algo_name, algo, DAG_store, DAG_ids, seed, result_path, repeats=REPEATS):
+    """
+    Schedule the DAGs by the engine repeats times and write the results of the first run into result_path. Return the
+    best seconds used by the engine (the results are converted and written out of the timing).
+    """
+    to_schedule = ALGOS[algo_name][1]
+    with ResultWriter(result_path) as writer:
+        seconds = time_results(ENGINES[engine](algo, DAG_store, DAG_ids, seed),
+                               lambda DAG_id, result: writer.append(to_schedule(result, DAG_store.get_DAG(DAG_id))))
+    for _ in range(repeats - 1):
+        seconds = min(seconds, time_results(ENGINES[engine](algo, DAG_store, DAG_ids, seed),
+                                            lambda DAG_id, result: None))
+    return seconds
+
+
+def iter_cases(algo_names, DAG_sets, seeds):
+    """
+    Yield (algo_name, algo, DAG_set_name, seed) of each case, the scenario of each seed is loaded once.
+    """
+    for seed in seeds:
+        args, kwargs = load_scenario(seed).get_algo_args()
+        for algo_name in algo_names:
+            algo = ALGOS[algo_name][0](*args, **kwargs)
+            for DAG_set_name in DAG_sets:
+                yield algo_name, algo, DAG_set_name, seed
+
+
+def record_golden(golden_path, algo_names=('DPE', 'FixDoc', 'HEFT'), DAG_sets=None, seeds=SEEDS, repeats=REPEATS):
+    """
+    Run the reference engine and record the golden files into the directory golden_path.
+    """
+    if DAG_sets is None:
+        DAG_sets = get_DAG_sets()
+    os.makedirs(golden_path, exist_ok=True)
+    cases = []
+    for algo_name, algo, DAG_set_name, seed in iter_cases(algo_names, DAG_sets, seeds):
+        DAG_store, DAG_ids = DAG_sets[DAG_set_name]
+        name = get_case_name(algo_name, DAG_set_name, seed)
+        seconds = run_case('reference', algo_name, algo, DAG_store, DAG_ids, seed, os.path.join(golden_path, name),
+                           repeats)
+        cases.append({'name': name, 'algo': algo_name, 'DAG_set': DAG_set_name, 'seed': seed, 'DAGs': len(DAG_ids),
+                      'seconds': seconds})
+        print('%-30s %6d DAGs %10.3f s' % (name, len(DAG_ids), seconds))
+    with open(os.path.join(golden_path, 'golden.json'), 'w') as f:
+        json.dump({'parameter_hash': get_parameter_hash(para), 'server_num': para.get_server_num(),
+                   'path_num': para.get_path_num(), 'cases': cases}, f, indent=1)
+
+
+def compare_stores(golden, result, tolerance=0.):
+    """
+    Compare two result stores. Return the number of DAGs which do not match and the largest difference of the
+    times.
+    """
+    if len(golden) != len(result) or not np.array_equal(golden.offsets, result.offsets):
+        return max(len(golden), len(result)), np.inf
+    mismatched = np.zeros(len(golden), dtype=bool)
+    # the DAG of each row
+    DAG_of_rows = np.repeat(np.arange(len(golden)), np.diff(np.asarray(golden.offsets)))
+    max_diff = 0.
+    for name in FUNC_COLUMNS + ['makespans']:
+        expected, actual = np.asarray(getattr(golden, name)), np.asarray(getattr(result, name))
+        if name in ['placements', 'positions']:
+            wrong = expected != actual
+        else:
+            both_nan = np.isnan(expected) & np.isnan(actual)
+            diff = np.where(both_nan, 0., np.abs(expected - actual))
+            diff[np.isnan(diff)] = np.inf
+            max_diff = max(max_diff, float(diff.max(initial=0.)))
+            wrong = diff > tolerance
+        if name == 'makespans':
+            mismatched |= wrong
+        else:
+            mismatched[DAG_of_rows[wrong]] = True
+    return int(mismatched.sum()), max_diff
+
+
+def check_engine(golden_path, engine, result_path, tolerance=0., DAG_sets=None, repeats=REPEATS):
+    """
+    Run the engine on the cases of the golden files and compare the results. Return a report (a list of dicts).
+    """
+    with open(os.path.join(golden_path, 'golden.json')) as f:
+        golden = json.load(f)
+    # the scenarios (bandwidth, processing power, ...) and the costs of the DAGs all depend on the parameters
+    if golden.get('parameter_hash') != get_parameter_hash(para):
+        raise ValueError('The golden files are recorded with other parameters (hash %s instead of %s), please record '
+                         'them again' % (golden.get('parameter_hash'), get_parameter_hash(para)))
+    if DAG_sets is None:
+        DAG_sets = get_DAG_sets()
+    cases = dict((case['name'], case) for case in golden['cases'])
+    algo_names = list(dict.fromkeys(case['algo'] for case in golden['cases']))
+    seeds = list(dict.fromkeys(case['seed'] for case in golden['cases']))
+
+    report = []
+    for algo_name, algo, DAG_set_name, seed in iter_cases(algo_names, DAG_sets, seeds):
+        case = cases.get(get_case_name(algo_name, DAG_set_name, seed))
+        if case is None:
+            continue
+        DAG_store, DAG_ids = DAG_sets[DAG_set_name]
+        seconds = run_case(engine, algo_name, algo, DAG_store, DAG_ids, seed, os.path.join(result_path, case['name']),
+                           repeats)
+        mismatched, max_diff = compare_stores(ResultStore.load(os.path.join(golden_path, case['name'])),
+                                              ResultStore.load(os.path.join(result_path, case['name'])), tolerance)
+        report.append({'name': case['name'], 'DAGs': case['DAGs'], 'mismatched': mismatched, 'max_diff': max_diff,
+                       'equivalent': mismatched == 0, 'seconds': seconds, 'reference_seconds': case['seconds']})
+    return report
+
+
+def print_report(report, engine, tolerance):
+    print('\nEngine %s against the golden files (tolerance %g):' % (engine, tolerance))
+    for r in report:
+        print('%-30s %-10s %6d/%-6d mismatched  max diff %-10.3g %8.3f s' %
+              (r['name'], 'EQUIVALENT' if r['equivalent'] else 'DIFFERENT', r['mismatched'], r['DAGs'],
+               r['max_diff'], r['seconds']))
+    seconds = sum(r['seconds'] for r in report)
+    reference_seconds = sum(r['reference_seconds'] for r in report)
+    print('Overall: %s, speedup %.2fx' % ('EQUIVALENT' if all(r['equivalent'] for r in report) else 'DIFFERENT',
+                                          reference_seconds / seconds if seconds > 0 else np.inf))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record golden outputs of the reference algorithms, or check an '
+                                                 'engine against them.')
+    parser.add_argument('command', choices=['record', 'check'])
+    parser.add_argument('--golden', default='golden', help='the directory of the golden files')
+    parser.add_argument('--engine', default='reference', choices=list(ENGINES))
+    parser.add_argument('--output', default='golden_check', help='the directory of the results of the engine')
+    parser.add_argument('--tolerance', type=float, default=0.)
+    parser.add_argument('--algos', nargs='+', default=list(ALGOS), choices=list(ALGOS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=SEEDS)
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='each case is timed by the best of the '
+                                                                         'repeated runs')
+    parser.add_argument('--sampled', type=int, default=SAMPLED_DAG_NUM, help='the number of DAGs sampled from '
+                                                                              'the DAG store')
+    args = parser.parse_args(argv)
+
+    DAG_sets = get_DAG_sets(sampled_DAG_num=args.sampled)
+    if args.command == 'record':
+        record_golden(args.golden, args.algos, DAG_sets, args.seeds, args.repeats)
+        print('The golden files are saved in %s' % args.golden)
+        return 0
+    report = check_engine(args.golden, args.engine, args.output, args.tolerance, DAG_sets, args.repeats)
+    print_report(report, args.engine, args.tolerance)
+    return 0 if all(r['equivalent'] for r in report) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -11,11 +11,20 @@ DATASET_PATH = os.path.join(DIR_PATH, 'dataset/batch_task.csv')
 SELECTED_DAG_PATH = os.path.join(DIR_PATH, 'dataset/selected_DAGs.csv')
 SORTED_DAG_PATH = os.path.join(DIR_PATH, 'dataset/topological_order.csv')
 TEST_DAG_PATH = os.path.join(DIR_PATH, 'dataset/test.csv')
+# the directory of the cached scenarios
+SCENARIO_CACHE_PATH = os.path.join(DIR_PATH, 'dataset/scenarios')
 
 MAX_VALUE = 9e+4
 REQUIRED_NUM = [200, 800, 600, 400, 119]
+# the smallest number of functions of the DAGs in each bucket of REQUIRED_NUM
+DAG_SIZE_BOUNDS = [2, 3, 11, 51, 101]
 MAX_FUNC_NUM = 250
 
+# the columns of batch_task.csv and the number of rows read from it at a time
+TRACE_COLUMNS = ['task_name', 'instance_num', 'job_name', 'task_type', 'status',
+                 'start_time', 'end_time', 'plan_cpu', 'plan_mem']
+CHUNK_SIZE = 500000
+
 
 class Parameter:
     def __init__(self):
@@ -28,6 +37,8 @@ class Parameter:
         self.__bw_lower, self.__bw_upper = 30, 70
         # processing power scope
         self.__pp_lower, self.__pp_upper = 7, 14
+        # the number of cheapest simple paths kept between any two servers (None means all the simple paths)
+        self.__path_num = None
 
         # DAG settings (processing power required by each function, the data stream size of each link)
         self.__pp_required_lower, self.__pp_required_upper = 1, 2
@@ -37,6 +48,7 @@ class Parameter:
     def set_server_num(self, server_num):
         assert server_num > 1
         self.__server_num = server_num
+        self.__n_pairs = server_num * (server_num - 1)
 
     def get_server_num(self):
         return self.__server_num
@@ -74,6 +86,13 @@ class Parameter:
     def get_pp_upper(self):
         return self.__pp_upper
 
+    def set_path_num(self, path_num):
+        assert path_num is None or path_num > 0
+        self.__path_num = path_num
+
+    def get_path_num(self):
+        return self.__path_num
+
     def set_pp_required_lower(self, pp_required_lower):
         self.__pp_required_lower = pp_required_lower
 
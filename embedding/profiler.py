@@ -0,0 +1,149 @@
+"""
+An opt-in profiler of the algorithms. It records the time spent in each phase, counts events, and reports the memory
+of each run, e.g.,
+    profiler = Profiler(callback=print)
+    dpe.get_response_time(profiler=profiler)
+    profiler.save('profile.json')
+
+The phases are
+    load        open (or compile) the DAG store,
+    parse       decode a DAG from the DAG store,
+    costs       precompute the costs of a DAG (e.g., choose the paths of FixDoc and HEFT),
+    placement   place the functions of a DAG,
+    ranking     rank the functions of a DAG (HEFT),
+    gap_search  search the gaps of the servers (HEFT, part of placement),
+and the counters are
+    T_optimal_recomputations (DPE and FixDoc), commcost_lookups and gap_scan_steps (HEFT).
+Each DAG gets a record of its phases and counters, which is passed to the callback and kept for the JSON report.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+class NullProfiler:
+    """
+    The profiler used when profiling is off, it does nothing.
+    """
+    enabled = False
+
+    def begin(self, name):
+        pass
+
+    def end(self, name):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def begin_run(self, name):
+        pass
+
+    def end_run(self):
+        pass
+
+    def begin_DAG(self, DAG_id, funcs_num):
+        pass
+
+    def end_DAG(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler(NullProfiler):
+    enabled = True
+
+    def __init__(self, callback=None, trace_memory=False, keep_records=True):
+        """
+        callback is called with each record (a dict), trace_memory turns on tracemalloc to get the peak memory
+        allocated by python during each run (slow, reported as peak_memory). Otherwise the peak resident memory of
+        the process so far is reported as process_peak_memory (on Unix only), which is a high-water mark over the
+        lifetime of the process, thus a run inherits the peak of the runs before it.
+        """
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.keep_records = keep_records
+        self.records = []
+        self.run, self.DAG = None, None
+        self.begins = dict()
+        self.started_tracing = False
+
+    def begin(self, name):
+        self.begins[name] = time.perf_counter()
+
+    def end(self, name):
+        elapsed = time.perf_counter() - self.begins.pop(name)
+        for record in (self.run, self.DAG):
+            if record is not None:
+                record['phases'][name] += elapsed
+
+    def count(self, name, n=1):
+        for record in (self.run, self.DAG):
+            if record is not None:
+                record['counters'][name] += n
+
+    def counted(self, func, name):
+        """
+        Wrap func, thus each call of it is counted as an event named name.
+        """
+        def counted_func(*args, **kwargs):
+            self.count(name)
+            return func(*args, **kwargs)
+        return counted_func
+
+    def begin_run(self, name):
+        self.run = {'type': 'run', 'name': name, 'DAGs': 0, 'phases': defaultdict(float),
+                    'counters': defaultdict(int), 'seconds': time.perf_counter()}
+        if self.trace_memory:
+            # the peak is reset for each run, and tracemalloc is left as it was if someone else already started it
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+
+    def end_run(self):
+        run, self.run = self.run, None
+        run['seconds'] = time.perf_counter() - run['seconds']
+        if self.trace_memory:
+            run['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            if self.started_tracing:
+                tracemalloc.stop()
+        else:
+            try:
+                # resource is only available on Unix
+                import resource
+                # ru_maxrss is in KiB on Linux
+                run['process_peak_memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            except ImportError:
+                pass
+        self.add_record(run)
+
+    def begin_DAG(self, DAG_id, funcs_num):
+        self.DAG = {'type': 'DAG', 'name': self.run['name'] if self.run else None, 'DAG_id': DAG_id,
+                    'funcs': funcs_num, 'phases': defaultdict(float), 'counters': defaultdict(int)}
+
+    def end_DAG(self):
+        DAG, self.DAG = self.DAG, None
+        if self.run is not None:
+            self.run['DAGs'] += 1
+        self.add_record(DAG)
+
+    def add_record(self, record):
+        record['phases'], record['counters'] = dict(record['phases']), dict(record['counters'])
+        if self.keep_records:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def report(self):
+        return {'runs': [r for r in self.records if r['type'] == 'run'],
+                'DAGs': [r for r in self.records if r['type'] == 'DAG']}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
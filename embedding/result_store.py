@@ -0,0 +1,177 @@
+"""
+Store the scheduling results of all the DAGs in columnar form, streamed to disk in chunks while the DAGs are
+scheduled, thus the results of millions of DAGs do not need to fit in memory.
+
+The store is a directory of raw binary files and meta.json (the dtype and length of each file), which are opened with
+memory-mapping:
+    offsets         the first row of each DAG, followed by the number of rows,
+    makespans       the makespan of each DAG,
+    placements      the server of each function (-1 if it is not placed),
+    start_times,
+    finish_times    the start and finish time of each function on its server,
+    positions       the position of each function in the sequence the functions are processed (DPE and FixDoc) or in
+                    the order of its server (HEFT), -1 if it is not placed.
+The rows of a DAG are its functions 1, 2, ..., n.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import json
+import shutil
+import numpy as np
+from collections import namedtuple
+from embedding.parameters import *
+
+
+# the results of a DAG
+Schedule = namedtuple('Schedule', 'placements start_times finish_times positions makespan')
+
+RESULT_DTYPES = {'offsets': np.int64, 'makespans': np.float64, 'placements': np.int32,
+                 'start_times': np.float64, 'finish_times': np.float64, 'positions': np.int32}
+# the columns with one row for each function
+FUNC_COLUMNS = ['placements', 'start_times', 'finish_times', 'positions']
+
+
+def get_schedule(T_optimal, funcs_deploy, process_sequence, start_time, makespan):
+    """
+    Convert the results of a DAG scheduled by DPE or FixDoc into a Schedule.
+    """
+    placements = np.asarray(funcs_deploy).astype(np.int32)
+    placed = np.flatnonzero(placements >= 0)
+    finish_times = np.full(len(placements), np.nan)
+    finish_times[placed] = T_optimal[placed, placements[placed]]
+    positions = -1 * np.ones(len(placements), dtype=np.int32)
+    positions[np.asarray(process_sequence, dtype=np.int64) - 1] = np.arange(len(process_sequence))
+    return Schedule(placements, np.asarray(start_time, dtype=float), finish_times, positions, float(makespan))
+
+
+def get_HEFT_schedule(orders, jobson, makespan, DAG_len):
+    """
+    Convert the results of a DAG scheduled by HEFT into a Schedule.
+    """
+    placements = -1 * np.ones(DAG_len, dtype=np.int32)
+    start_times = np.full(DAG_len, np.nan)
+    finish_times = np.full(DAG_len, np.nan)
+    positions = -1 * np.ones(DAG_len, dtype=np.int32)
+    for agent, events in orders.items():
+        # the servers are named 'server n + 1'
+        server = int(agent.split(' ')[-1]) - 1
+        for position, event in enumerate(events):
+            if 0 < event.job <= DAG_len:
+                placements[event.job - 1] = server
+                start_times[event.job - 1], finish_times[event.job - 1] = event.start, event.end
+                positions[event.job - 1] = position
+    return Schedule(placements, start_times, finish_times, positions, float(makespan))
+
+
+def get_process_sequence(schedule):
+    """
+    Get the functions placed, in the order of their positions.
+    """
+    placed = np.flatnonzero(np.asarray(schedule.positions) >= 0)
+    return (placed[np.argsort(schedule.positions[placed], kind='stable')] + 1).tolist()
+
+
+class ResultWriter:
+    def __init__(self, result_path, chunk_size=CHUNK_SIZE):
+        """
+        Write the results into the directory result_path. The results are buffered and appended to the files every
+        chunk_size functions. The directory is replaced as a whole when the writer is closed.
+        """
+        self.result_path, self.chunk_size = result_path, chunk_size
+        self.tmp_path = result_path + '.tmp'
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+        self.files = dict((name, open(os.path.join(self.tmp_path, name), 'wb')) for name in RESULT_DTYPES)
+        self.buffers = dict((name, []) for name in RESULT_DTYPES)
+        self.lengths = dict((name, 0) for name in RESULT_DTYPES)
+        self.rows, self.buffered_rows = 0, 0
+        self.write('offsets', [np.zeros(1)])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, schedule):
+        rows = len(schedule.placements)
+        for name in FUNC_COLUMNS:
+            self.buffers[name].append(getattr(schedule, name))
+        self.buffers['makespans'].append(np.array([schedule.makespan]))
+        self.rows += rows
+        self.buffers['offsets'].append(np.array([self.rows]))
+        self.buffered_rows += rows
+        if self.buffered_rows >= self.chunk_size:
+            self.flush()
+
+    def write(self, name, arrays):
+        array = np.concatenate(arrays).astype(RESULT_DTYPES[name])
+        array.tofile(self.files[name])
+        self.lengths[name] += len(array)
+
+    def flush(self):
+        for name in RESULT_DTYPES:
+            if self.buffers[name]:
+                self.write(name, self.buffers[name])
+                self.buffers[name] = []
+        self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        meta = dict((name, {'dtype': np.dtype(dtype).str, 'length': self.lengths[name]})
+                    for name, dtype in RESULT_DTYPES.items())
+        with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        if os.path.exists(self.result_path):
+            shutil.rmtree(self.result_path)
+        os.rename(self.tmp_path, self.result_path)
+
+    def abort(self):
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp_path)
+
+
+class ResultStore:
+    def __init__(self, offsets, makespans, placements, start_times, finish_times, positions):
+        self.offsets, self.makespans = offsets, makespans
+        self.placements, self.start_times, self.finish_times = placements, start_times, finish_times
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_schedule(i)
+
+    def get_schedule(self, i):
+        """
+        Get the results of the i-th DAG (views of the memory-mapped files).
+        """
+        begin, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return Schedule(self.placements[begin: end], self.start_times[begin: end], self.finish_times[begin: end],
+                        self.positions[begin: end], float(self.makespans[i]))
+
+    @staticmethod
+    def load(result_path):
+        """
+        Open the store saved in the directory result_path with memory-mapping.
+        """
+        with open(os.path.join(result_path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = []
+        for name in RESULT_DTYPES:
+            dtype, length = np.dtype(meta[name]['dtype']), meta[name]['length']
+            if length == 0:
+                # an empty file can not be memory-mapped
+                arrays.append(np.zeros(0, dtype=dtype))
+            else:
+                arrays.append(np.memmap(os.path.join(result_path, name), dtype=dtype, mode='r', shape=(length,)))
+        return ResultStore(*arrays)
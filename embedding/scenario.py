@@ -6,6 +6,9 @@ import numpy as np
 import pandas as pd
 import random
 import pprint
+import heapq
+import itertools
+from collections import namedtuple
 from embedding.utils import ProgressBar
 from embedding.parameters import *
 
@@ -13,63 +16,49 @@ from embedding.parameters import *
 bar = ProgressBar()
 para = Parameter()
 
+# the outputs of get_ratio() as arrays (see get_ratio_arrays())
+RatioArrays = namedtuple('RatioArrays', 'first_reciprocals proportions path_offsets path_reciprocals')
 
-def generate_scenario():
+
+def generate_scenario(constructive=False):
     """
     Generate the edge computing scenario, i.e., generate a connected graph of edge servers,
     including the
         connectivity,
         processing power of each server,
         bandwidth of each physical link.
+
+    By default, random links are added until the graph is connected. If constructive is True, the graph is built
+    connected directly (see construct_graph()) and all the random values are drawn from np.random at once, which
+    scales to thousands of servers.
     """
-    # step 1: generate a connected graph
-    # initialize
-    G = np.zeros((para.get_server_num(), para.get_server_num()))
-    D = np.ones((para.get_server_num(), para.get_server_num())) * MAX_VALUE
+    if constructive:
+        G = construct_graph()
+        # step 2: set the bandwidth
+        bw = -1 * np.ones((para.get_server_num(), para.get_server_num()))
+        src, dst = np.nonzero(np.tril(G, -1))
+        b = np.random.randint(para.get_bw_lower(), para.get_bw_upper() + 1, len(src))
+        bw[src, dst], bw[dst, src] = b, b
+    else:
+        # step 1: generate a connected graph
+        # initialize
+        G = np.zeros((para.get_server_num(), para.get_server_num()))
+        np.fill_diagonal(G, 1)
+        while not is_connected(G):
+            for i in range(para.get_server_num()):
+                # randomly connect i and at most 'DENSITY' other servers
+                conn_node_num = random.randint(0, para.get_density())
+                for j in range(conn_node_num):
+                    k = random.randint(0, para.get_server_num() - 1)
+                    G[i, k], G[k, i] = 1, 1
 
-    is_connected = False
-    for i in range(para.get_server_num()):
-        G[i, i] = 1
-        D[i, i] = 0
-
-    while not is_connected:
-        for i in range(para.get_server_num()):
-            # randomly connect i and at most 'DENSITY' other servers
-            conn_node_num = random.randint(0, para.get_density())
-            for j in range(conn_node_num):
-                k = random.randint(0, para.get_server_num() - 1)
-                G[i, k], G[k, i] = 1, 1
-
-        for i in range(para.get_server_num()):
-            for j in range(para.get_server_num()):
-                if G[i, j] == 1:
-                    D[i, j], D[j, i] = 1, 1
-        for i in range(para.get_server_num()):
-            for j in range(para.get_server_num()):
-                for k in range(para.get_server_num()):
-                    if D[j, k] > D[j, i] + D[i, k]:
-                        D[j, k] = D[j, i] + D[i, k]
-
-        is_continue = False
-        for i in range(para.get_server_num()):
-            for j in range(para.get_server_num()):
-                if D[i, j] == MAX_VALUE:
-                    # the graph is not a connected graph
-                    is_continue = True
-                    break
-        if is_continue == False:
-            is_connected = True
-
-
-    # step 2: set the bandwidth
-    bw = np.ones((para.get_server_num(), para.get_server_num())) * -1
-    for i in range(para.get_server_num()):
-        j = 0
-        while j < i:
-            if G[i, j] == 1:
-                b = random.randint(para.get_bw_lower(), para.get_bw_upper())
-                bw[i, j], bw[j, i] = b, b
-            j = j + 1
+        # step 2: set the bandwidth
+        bw = -1 * np.ones((para.get_server_num(), para.get_server_num()))
+        # the links (i, j) with j < i, in the order of i and then j
+        src, dst = np.nonzero(np.tril(G, -1))
+        for i, j in zip(src.tolist(), dst.tolist()):
+            b = random.randint(para.get_bw_lower(), para.get_bw_upper())
+            bw[i, j], bw[j, i] = b, b
 
     # step 3: set the processing power
     pp = np.random.randint(para.get_pp_lower(), para.get_pp_upper(), (para.get_server_num()))
@@ -77,6 +66,41 @@ def generate_scenario():
     return G, bw, pp
 
 
+def construct_graph():
+    """
+    Build a connected graph of edge servers directly: a random spanning tree (each server, in a random order, is
+    linked to one of the servers before it), plus at most 'DENSITY' random links from each server.
+    """
+    server_num = para.get_server_num()
+    G = np.zeros((server_num, server_num))
+    np.fill_diagonal(G, 1)
+
+    order = np.random.permutation(server_num)
+    src = order[1:]
+    dst = order[(np.random.rand(server_num - 1) * np.arange(1, server_num)).astype(int)]
+    G[src, dst], G[dst, src] = 1, 1
+
+    conn_node_num = np.random.randint(0, para.get_density() + 1, server_num)
+    src = np.repeat(np.arange(server_num), conn_node_num)
+    dst = np.random.randint(0, server_num, len(src))
+    G[src, dst], G[dst, src] = 1, 1
+    return G
+
+
+def is_connected(G):
+    """
+    Check whether all the servers can be reached from server 0, by expanding the reached servers hop by hop.
+    """
+    linked = G > 0
+    reached = np.zeros(len(G), dtype=bool)
+    reached[0] = True
+    frontier = reached.copy()
+    while frontier.any():
+        frontier = linked[frontier].any(axis=0) & ~reached
+        reached |= frontier
+    return reached.all()
+
+
 def print_scenario(G, bw, pp):
     print('\nThe connected graph of edge servers (represented by adjcent matrix):')
     pprint.pprint(G)
@@ -86,10 +110,13 @@ def print_scenario(G, bw, pp):
     pprint.pprint(pp)
 
 
-def go_forward(node, node_dst, paths_ij, path_ij, path_nodes_ij, G):
+def go_forward(node, node_dst, paths_ij, path_ij, path_nodes_ij, G, neighbors=None):
     """
     The recursive algorithm (OSM) to find all the simple paths between any two node i and j.
+    neighbors[node] lists the servers connected to node in increasing order, which is computed from G if not given.
     """
+    if neighbors is None:
+        neighbors = get_neighbors(G)
     if node == node_dst:
         path_ij.append(node)
         paths_ij.append(path_ij[:])
@@ -97,31 +124,213 @@ def go_forward(node, node_dst, paths_ij, path_ij, path_nodes_ij, G):
     else:
         path_ij.append(node)
         path_nodes_ij.add(node)
-        for i in range(para.get_server_num()):
-            if G[node][i] and (i not in path_nodes_ij):
-                go_forward(i, node_dst, paths_ij, path_ij, path_nodes_ij, G)
+        for i in neighbors[node]:
+            if i not in path_nodes_ij:
+                go_forward(i, node_dst, paths_ij, path_ij, path_nodes_ij, G, neighbors)
         path_ij.pop()
         path_nodes_ij.discard(node)
 
 
-def get_simple_paths(G):
+def get_neighbors(G):
+    return [np.flatnonzero(G[i]).tolist() for i in range(para.get_server_num())]
+
+
+def get_simple_paths(G, bw=None, path_num=None):
     """
     Get all the simple paths between any two edge servers. Call the subroutine go_forward().
+    The paths between i and j are in lexicographic order, which is the order go_forward() finds them.
+
+    If path_num (para.get_path_num() by default) is set, only the path_num cheapest simple paths between any two
+    servers are found (see get_cheapest_paths()) instead of enumerating all of them, whose number is exponential.
+
+    G is symmetric, thus the paths from j to i are the reversed paths from i to j and only the paths with i < j are
+    searched.
     """
-    simple_paths = []
-    for i in range(para.get_server_num()):
-        paths_from_i = []
-        for j in range(para.get_server_num()):
-            node = i
-            node_dst = j
-            paths_ij, path_ij = [], []
-            path_nodes_ij = set()
-            go_forward(node, node_dst, paths_ij, path_ij, path_nodes_ij, G)
-            paths_from_i.append(paths_ij)
-        simple_paths.append(paths_from_i)
+    if path_num is None:
+        path_num = para.get_path_num()
+    server_num = para.get_server_num()
+    neighbors = get_neighbors(G)
+    symmetric = (G == G.T).all()
+    if path_num is not None:
+        weights = get_link_weights(G, bw)
+        adjacency = get_adjacency(neighbors, weights)
+        if path_num > 1:
+            # the cost from each server to each server j, the lower bounds of the deviations (see get_cheapest_paths())
+            reversed_adjacency = get_reversed_adjacency(adjacency)
+            dist_to = [get_shortest_path_tree(reversed_adjacency, j)[0] for j in range(server_num)]
+
+    simple_paths = [[None] * server_num for _ in range(server_num)]
+    for i in range(server_num):
+        if path_num is not None:
+            # the cheapest paths from i to all the servers
+            prev = get_shortest_path_tree(adjacency, i)[1]
+        for j in range(server_num):
+            if symmetric and j < i:
+                # in lexicographic order, as if they are found by go_forward() or get_cheapest_paths()
+                reversed_paths = [path[::-1] for path in simple_paths[j][i]]
+                if path_num is None:
+                    reversed_paths.sort()
+                simple_paths[i][j] = reversed_paths
+            elif path_num is None:
+                paths_ij = []
+                go_forward(i, j, paths_ij, [], set(), G, neighbors)
+                simple_paths[i][j] = paths_ij
+            else:
+                simple_paths[i][j] = get_cheapest_paths(adjacency, weights, i, j, path_num, get_tree_path(prev, i, j),
+                                                        dist_to[j] if path_num > 1 else None)
     return simple_paths
 
 
+def get_link_weights(G, bw=None):
+    """
+    The weight of each link is the reciprocal of its bandwidth, or one if bw is not given.
+    """
+    if bw is None:
+        return np.where(G > 0, 1., np.inf)
+    with np.errstate(divide='ignore'):
+        return np.where((G > 0) & (bw > 0), 1. / bw, np.inf)
+
+
+def get_path_weight(path, weights):
+    weight = 0
+    for l in range(len(path) - 1):
+        weight = weight + weights[path[l], path[l + 1]]
+    return weight
+
+
+def get_adjacency(neighbors, weights):
+    """
+    adjacency[node] lists (i, weight of link (node, i)) of the servers i linked to node, without the links of
+    infinite weight.
+    """
+    return [[(i, float(weights[node, i])) for i in neighbors[node] if i != node and weights[node, i] < np.inf]
+            for node in range(len(neighbors))]
+
+
+def get_reversed_adjacency(adjacency):
+    """
+    The adjacency of the reversed links, i.e., reversed_adjacency[i] lists (node, weight of link (node, i)).
+    """
+    reversed_adjacency = [[] for _ in adjacency]
+    for node, links in enumerate(adjacency):
+        for i, weight in links:
+            reversed_adjacency[i].append((node, weight))
+    return reversed_adjacency
+
+
+def get_shortest_path_tree(adjacency, src, dst=None, removed_nodes=(), removed_next=(), lower_bounds=None,
+                           max_cost=np.inf):
+    """
+    Dijkstra's algorithm on the servers except removed_nodes, where the servers removed_next can not be reached from
+    src directly. Return dist (a list, np.inf if the server is not reached) and prev, the tree of the cheapest paths
+    from src (prev[i] is the server before i). If dst is given, the search stops once the cheapest path to dst is
+    found.
+
+    If lower_bounds (the lower bound of the cost from each server to dst) is given, the servers i which can only be
+    on the paths more expensive than max_cost (dist[i] + lower_bounds[i] > max_cost) are left out.
+    """
+    dist = [np.inf] * len(adjacency)
+    # the removed servers can never be reached with a lower cost
+    for node in removed_nodes:
+        dist[node] = -np.inf
+    dist[src] = 0.
+    if lower_bounds is None:
+        lower_bounds = [0.] * len(adjacency)
+    prev = dict()
+    heap = [(0., src)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node == dst:
+            break
+        if d > dist[node]:
+            continue
+        links = adjacency[node]
+        if node == src and removed_next:
+            links = [(i, weight) for i, weight in links if i not in removed_next]
+        for i, weight in links:
+            d_i = d + weight
+            if d_i < dist[i] and d_i + lower_bounds[i] <= max_cost:
+                dist[i] = d_i
+                prev[i] = node
+                heapq.heappush(heap, (d_i, i))
+    for node in removed_nodes:
+        dist[node] = np.inf
+    return dist, prev
+
+
+def get_tree_path(prev, src, dst):
+    """
+    Get the path from src to dst in the tree prev (see get_shortest_path_tree()), or None if dst is not reached.
+    """
+    if dst != src and dst not in prev:
+        return None
+    path = [dst]
+    while path[-1] != src:
+        path.append(prev[path[-1]])
+    return path[::-1]
+
+
+def get_shortest_path(adjacency, src, dst, removed_nodes=(), removed_next=(), lower_bounds=None, max_cost=np.inf):
+    """
+    Return the cheapest path from src to dst, or None if dst can not be reached (see get_shortest_path_tree()).
+    """
+    prev = get_shortest_path_tree(adjacency, src, dst, removed_nodes, removed_next, lower_bounds, max_cost)[1]
+    return get_tree_path(prev, src, dst)
+
+
+def get_cheapest_paths(adjacency, weights, src, dst, path_num, first_path=None, dist_to_dst=None):
+    """
+    Find the path_num cheapest simple paths from src to dst with Yen's algorithm, where the cost of a path is the
+    sum of weights of its links. The paths are sorted by their cost (the cheapest is the first).
+
+    first_path (the cheapest path) and dist_to_dst (the cost from each server to dst) can be read from the trees of
+    src and dst, they are searched if not given. Once there are enough candidates, the deviations more expensive
+    than them can not be chosen and are not searched (see get_shortest_path_tree()), which gets the same paths.
+    """
+    if src == dst:
+        return [[src]]
+    if first_path is None:
+        first_path = get_shortest_path(adjacency, src, dst)
+    if first_path is None:
+        return []
+    paths = [first_path]
+    if path_num == 1:
+        return paths
+    if dist_to_dst is None:
+        dist_to_dst = get_shortest_path_tree(get_reversed_adjacency(adjacency), dst)[0]
+    # the candidates (cost, path) which have not been chosen, and all the paths found so far
+    candidates = []
+    found = {tuple(first_path)}
+    # the deviations searched, (root_path, removed_next), which get the same spur path if they are searched again
+    searched = set()
+    while len(paths) < path_num:
+        last_path = paths[-1]
+        # deviate from last_path at its i-th node, from the last one, whose search is the cheapest
+        for i in reversed(range(len(last_path) - 1)):
+            root_path = last_path[:i + 1]
+            removed_next = frozenset(path[i + 1] for path in paths if path[:i + 1] == root_path)
+            if (tuple(root_path), removed_next) in searched:
+                continue
+            searched.add((tuple(root_path), removed_next))
+            max_cost = np.inf
+            if len(candidates) >= path_num - len(paths):
+                # with a little slack for the rounding errors of the costs
+                max_cost = heapq.nsmallest(path_num - len(paths), candidates)[-1][0] * (1 + 1e-9)
+                max_cost -= get_path_weight(root_path, weights)
+            spur_path = get_shortest_path(adjacency, last_path[i], dst, set(root_path[:-1]), removed_next,
+                                          dist_to_dst, max_cost)
+            if spur_path is None:
+                continue
+            path = root_path[:-1] + spur_path
+            if tuple(path) not in found:
+                found.add(tuple(path))
+                heapq.heappush(candidates, (get_path_weight(path, weights), path))
+        if not candidates:
+            break
+        paths.append(heapq.heappop(candidates)[1])
+    return paths
+
+
 def print_simple_paths(simple_paths):
     print('\n====> All simple paths between any two server <====')
     pprint.pprint(simple_paths)
@@ -172,6 +381,89 @@ def get_ratio(simple_paths, bw):
     return reciprocals_list, proportions_list
 
 
+def get_ratio_arrays(simple_paths, bw):
+    """
+    The array version of get_ratio(). Return RatioArrays, in which
+        first_reciprocals[i][j] is the sum of the reciprocal of bandwidth of the first simple path from i to j,
+        proportions[i][j] is the proportion of data stream size which routes through this path (zeros if i == j),
+        path_reciprocals[path_offsets[i * n + j]: path_offsets[i * n + j + 1]] are the sums of all the simple paths
+        from i to j (n is the number of servers).
+    The sums are added up in the same order as get_ratio(), thus the values are exactly the same.
+    """
+    server_num = para.get_server_num()
+    pairs = [(i, j) for i in range(server_num) for j in range(server_num)]
+    paths_num = np.array([len(simple_paths[i][j]) if i != j else 0 for i, j in pairs], dtype=np.int64)
+    path_offsets = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(paths_num, out=path_offsets[1:])
+
+    # the links of all the paths, path after path
+    paths = [path for i, j in pairs if i != j for path in simple_paths[i][j]]
+    links_num = np.array([len(path) - 1 for path in paths], dtype=np.int64)
+    nodes = np.fromiter(itertools.chain.from_iterable(paths), dtype=np.int64, count=int(links_num.sum()) + len(paths))
+    is_link = np.ones(len(nodes), dtype=bool)
+    is_link[np.cumsum(links_num + 1) - 1] = False
+    link_src = np.flatnonzero(is_link)
+    link_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum(links_num, out=link_offsets[1:])
+    path_reciprocals = segment_sums(1. / bw[nodes[link_src], nodes[link_src + 1]], link_offsets)
+
+    has_paths = paths_num > 0
+    first_reciprocals = np.zeros(len(pairs))
+    first_reciprocals[has_paths] = path_reciprocals[path_offsets[:-1][has_paths]]
+    proportions = np.zeros(len(pairs))
+    ratios = np.repeat(first_reciprocals, paths_num) / path_reciprocals
+    proportions[has_paths] = 1. / segment_sums(ratios, path_offsets)[has_paths]
+
+    return RatioArrays(first_reciprocals.reshape(server_num, server_num), proportions.reshape(server_num, server_num),
+                       path_offsets, path_reciprocals)
+
+
+def to_ratio_arrays(reciprocals_list, proportions_list):
+    """
+    Convert the outputs of get_ratio() into RatioArrays.
+    """
+    server_num = para.get_server_num()
+    first_reciprocals = np.zeros((server_num, server_num))
+    proportions = np.zeros((server_num, server_num))
+    path_offsets = np.zeros(server_num * server_num + 1, dtype=np.int64)
+    path_reciprocals = []
+    for i in range(server_num):
+        for j in range(server_num):
+            if i != j:
+                first_reciprocals[i][j] = reciprocals_list[i][j][0]
+                proportions[i][j] = proportions_list[i][j]
+                path_reciprocals.extend(reciprocals_list[i][j])
+            path_offsets[i * server_num + j + 1] = len(path_reciprocals)
+    return RatioArrays(first_reciprocals, proportions, path_offsets, np.array(path_reciprocals, dtype=float))
+
+
+def segment_sums(values, offsets):
+    """
+    Sum values[offsets[k]: offsets[k + 1]] for each k. The values of a segment are added one by one as sum() does.
+    """
+    lens = np.diff(offsets)
+    sums = np.zeros(len(lens))
+    for l in range(int(lens.max(initial=0))):
+        segments = np.flatnonzero(lens > l)
+        sums[segments] += values[offsets[segments] + l]
+    return sums
+
+
+def choose_path_reciprocals(ratio_arrays, rng=random):
+    """
+    Randomly choose a simple path between any two different servers (in the order of pairs, one rng.randint() for
+    each pair). Return the matrix of the sums of the reciprocal of bandwidth of the chosen paths (zeros if i == j).
+    """
+    server_num = len(ratio_arrays.first_reciprocals)
+    path_offsets = ratio_arrays.path_offsets
+    pairs = np.flatnonzero(~np.eye(server_num, dtype=bool))
+    paths_num = (path_offsets[pairs + 1] - path_offsets[pairs]).tolist()
+    chosen_paths = [rng.randint(0, num - 1) for num in paths_num]
+    chosen_path_reciprocals = np.zeros(server_num * server_num)
+    chosen_path_reciprocals[pairs] = ratio_arrays.path_reciprocals[path_offsets[pairs] + chosen_paths]
+    return chosen_path_reciprocals.reshape(server_num, server_num)
+
+
 def set_funcs():
     """
     Set the processing power required and the output data stream size of functions.
@@ -187,3 +479,23 @@ def set_funcs():
         para.get_data_stream_size_upper(),
         (para.get_max_func_num()))
     return pp_required, data_stream
+
+
+def get_DAG_costs(DAG):
+    """
+    Get the processing power required and the output data stream size of each function of a DAG (function i + 1)
+    from the costs derived from the trace columns (see dag_store.get_func_costs()), scaled into the ranges of para.
+    Unlike set_funcs(), the costs are different for each DAG and there is no limit on the number of functions.
+    """
+    if DAG.pp_required is None:
+        raise ValueError('The costs of the functions of DAG %s are unknown (the trace columns are absent)' % DAG.name)
+    DAG_len = len(DAG.funcs)
+    funcs = np.array(list(DAG.rows.keys()), dtype=np.int64)
+    rows = np.array(list(DAG.rows.values()), dtype=np.int64)
+    valid = (funcs > 0) & (funcs <= DAG_len)
+    pp_required, data_stream = np.zeros(DAG_len), np.zeros(DAG_len)
+    pp_required[funcs[valid] - 1] = para.get_pp_required_lower() + np.asarray(DAG.pp_required)[rows[valid]] * \
+        (para.get_pp_required_upper() - para.get_pp_required_lower())
+    data_stream[funcs[valid] - 1] = para.get_data_stream_size_lower() + np.asarray(DAG.data_stream)[rows[valid]] * \
+        (para.get_data_stream_size_upper() - para.get_data_stream_size_lower())
+    return pp_required, data_stream
@@ -0,0 +1,138 @@
+"""
+Cache the generated edge computing scenarios on disk, thus an experiment does not need to generate the scenario,
+enumerate the simple paths and calculate the ratios again.
+
+A scenario is generated from a seed (of both random and np.random) and the settings of Parameter. It is saved in the
+directory 'scenario-<seed>-<hash of the settings>' as .npy files opened with memory-mapping:
+    G, bw, pp,
+    path_offsets, node_offsets, nodes
+        the k-th simple path is nodes[node_offsets[k]: node_offsets[k + 1]], and the simple paths from i to j (i != j)
+        are the k-th paths for k in [path_offsets[i * n + j], path_offsets[i * n + j + 1]),
+    first_reciprocals, proportions, path_reciprocals
+        the ratios (see scenario.get_ratio_arrays()), which share path_offsets with the simple paths,
+    pp_required, data_stream.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import shutil
+import random
+import hashlib
+import numpy as np
+from embedding.scenario import *
+
+
+SCENARIO_ARRAYS = ['G', 'bw', 'pp', 'path_offsets', 'node_offsets', 'nodes',
+                   'first_reciprocals', 'proportions', 'path_reciprocals', 'pp_required', 'data_stream']
+
+
+class Scenario:
+    def __init__(self, G, bw, pp, path_offsets, node_offsets, nodes,
+                 first_reciprocals, proportions, path_reciprocals, pp_required, data_stream):
+        self.G, self.bw, self.pp = G, bw, pp
+        self.path_offsets, self.node_offsets, self.nodes = path_offsets, node_offsets, nodes
+        self.first_reciprocals, self.proportions, self.path_reciprocals = first_reciprocals, proportions, path_reciprocals
+        self.pp_required, self.data_stream = pp_required, data_stream
+
+    def get_ratio_arrays(self):
+        return RatioArrays(self.first_reciprocals, self.proportions, self.path_offsets, self.path_reciprocals)
+
+    def get_simple_paths(self):
+        """
+        Rebuild the simple paths as the nested lists of get_simple_paths().
+        """
+        server_num = len(self.G)
+        nodes = self.nodes.tolist()
+        node_offsets = self.node_offsets.tolist()
+        path_offsets = self.path_offsets.tolist()
+        simple_paths = [[None] * server_num for _ in range(server_num)]
+        for i in range(server_num):
+            for j in range(server_num):
+                if i == j:
+                    simple_paths[i][j] = [[i]]
+                    continue
+                pair = i * server_num + j
+                simple_paths[i][j] = [nodes[node_offsets[k]: node_offsets[k + 1]]
+                                      for k in range(path_offsets[pair], path_offsets[pair + 1])]
+        return simple_paths
+
+    def get_algo_args(self):
+        """
+        The arguments of the constructors of DPE, FixDoc and HEFT (the ratios are passed as arrays).
+        """
+        return (self.G, self.bw, self.pp, None, None, None, self.pp_required, self.data_stream), \
+               {'ratio_arrays': self.get_ratio_arrays()}
+
+    def save(self, scenario_path):
+        """
+        Save the scenario into the directory scenario_path. The directory is replaced as a whole.
+        """
+        tmp_path = scenario_path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name in SCENARIO_ARRAYS:
+            np.save(os.path.join(tmp_path, name + '.npy'), getattr(self, name))
+        if os.path.exists(scenario_path):
+            shutil.rmtree(scenario_path)
+        os.rename(tmp_path, scenario_path)
+
+    @staticmethod
+    def load(scenario_path, mmap_mode='r'):
+        """
+        Open the scenario saved in the directory scenario_path with memory-mapping.
+        """
+        arrays = [np.load(os.path.join(scenario_path, name + '.npy'), mmap_mode=mmap_mode) for name in SCENARIO_ARRAYS]
+        return Scenario(*arrays)
+
+
+def get_parameter_hash(parameter=para):
+    """
+    The hash of all the settings of parameter. Any change of them changes the hash.
+    """
+    settings = sorted(vars(parameter).items())
+    return hashlib.sha1(repr(settings).encode()).hexdigest()[:16]
+
+
+def get_scenario_path(seed, constructive=False, cache_path=SCENARIO_CACHE_PATH):
+    name = 'scenario-%d-%s' % (seed, get_parameter_hash())
+    if constructive:
+        name += '-constructive'
+    return os.path.join(cache_path, name)
+
+
+def build_scenario(seed, constructive=False):
+    """
+    Generate the scenario, the simple paths, the ratios and the functions' requirements with seed.
+    The states of random and np.random are restored afterwards, thus they are the same whether the scenario is
+    generated or loaded from the cache.
+    """
+    random_state, np_random_state = random.getstate(), np.random.get_state()
+    try:
+        random.seed(seed)
+        np.random.seed(seed)
+        G, bw, pp = generate_scenario(constructive)
+        simple_paths = get_simple_paths(G, bw)
+        ratio_arrays = get_ratio_arrays(simple_paths, bw)
+        pp_required, data_stream = set_funcs()
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+
+    paths = [path for i in range(len(G)) for j in range(len(G)) if i != j for path in simple_paths[i][j]]
+    node_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(path) for path in paths], out=node_offsets[1:])
+    nodes = np.array([node for path in paths for node in path], dtype=np.int64)
+    return Scenario(G, bw, np.asarray(pp), ratio_arrays.path_offsets, node_offsets, nodes,
+                    ratio_arrays.first_reciprocals, ratio_arrays.proportions, ratio_arrays.path_reciprocals,
+                    np.asarray(pp_required), np.asarray(data_stream))
+
+
+def load_scenario(seed, constructive=False, cache_path=SCENARIO_CACHE_PATH):
+    """
+    Open the cached scenario of seed and the current settings of para, generate and cache it firstly if it is absent.
+    """
+    scenario_path = get_scenario_path(seed, constructive, cache_path)
+    if not os.path.exists(scenario_path):
+        print('Generating the scenario into %s ...' % scenario_path)
+        build_scenario(seed, constructive).save(scenario_path)
+    return Scenario.load(scenario_path)
@@ -0,0 +1,214 @@
+"""
+A long-running scheduling service in front of DPE, FixDoc and HEFT. The scenario is loaded once (see
+scenario_cache.py) and the algorithms are kept in memory.
+
+Clients connect to a TCP socket on localhost and send one JSON request per line, e.g.,
+    {"id": 1, "algo": "DPE", "task_names": ["M1", "R2_1", "J3_1_2"]}
+and get one JSON response per line in the same order, e.g.,
+    {"id": 1, "algo": "DPE", "funcs_deploy": [0, 2, 2], "makespan": 0.42}
+where funcs_deploy[i] is the server of function i + 1 (or {"id": 1, "error": "..."}).
+The task names of a DAG can be in any order, they are sorted in topological order by the service.
+
+Requests arrived within batch_window seconds (at most max_batch of them) are placed together as a micro-batch in a
+worker thread, thus the event loop keeps receiving requests. When queue_size requests are waiting, the service stops
+reading from the connections until the queue is drained (backpressure).
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import sys
+import json
+import random
+import socket
+import asyncio
+import argparse
+from embedding.dag_store import make_DAG
+from embedding.dataset_processing import topological_sort
+from embedding.scenario_cache import load_scenario
+from embedding.algos.dpe import DPE
+from embedding.algos.fixdoc import FixDoc
+from embedding.algos.heft import HEFT
+
+
+ALGOS = {'DPE': DPE, 'FixDoc': FixDoc, 'HEFT': HEFT}
+
+
+def get_sorted_DAG(task_names, name=''):
+    """
+    Sort the task names of a DAG in topological order and build the DAG.
+    """
+    DAG = make_DAG(task_names, name)
+    order = topological_sort(DAG.funcs, DAG.parents)
+    return make_DAG([task_names[i] for i in order], name)
+
+
+def place(algo_name, algo, DAG, rng):
+    """
+    Schedule a DAG by algo. Return the server of each function (function i + 1) and the makespan.
+    """
+    if algo_name == 'HEFT':
+        _, jobson, makespan = algo.schedule_DAG(DAG, rng)
+        funcs_deploy = [int(jobson[f]) if f in jobson else -1 for f in range(1, len(DAG.funcs) + 1)]
+    else:
+        _, funcs_deploy, _, _, makespan = algo.schedule_DAG(DAG, rng)
+        funcs_deploy = funcs_deploy.astype(int).tolist()
+    return funcs_deploy, float(makespan)
+
+
+class SchedulingService:
+    def __init__(self, algos, seed=0, batch_window=0.005, max_batch=64, queue_size=1024):
+        """
+        algos maps the names of the algorithms to the algorithm objects.
+        """
+        self.algos = algos
+        self.rng = random.Random(seed)
+        self.batch_window, self.max_batch = batch_window, max_batch
+        self.queue_size = queue_size
+        self.queue, self.batcher_task = None, None
+        # the size of each micro-batch placed
+        self.batch_sizes = []
+
+    def handle_request(self, request):
+        """
+        Place one request (a dict). Return the response (a dict).
+        """
+        response = {'id': request.get('id')}
+        try:
+            algo_name = request.get('algo', 'DPE')
+            if algo_name not in self.algos:
+                raise ValueError('Unknown algorithm: %s' % algo_name)
+            task_names = request['task_names']
+            DAG = get_sorted_DAG(task_names, str(request.get('name', '')))
+            funcs_deploy, makespan = place(algo_name, self.algos[algo_name], DAG, self.rng)
+            response.update({'algo': algo_name, 'funcs_deploy': funcs_deploy, 'makespan': makespan})
+        except Exception as e:
+            response['error'] = '%s: %s' % (type(e).__name__, e)
+        return response
+
+    def handle_batch(self, requests):
+        return [self.handle_request(request) for request in requests]
+
+    async def batcher(self):
+        """
+        Take the requests from the queue as micro-batches and place each batch in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batch_sizes.append(len(batch))
+            responses = await loop.run_in_executor(None, self.handle_batch, [request for request, _ in batch])
+            for (_, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Read the requests of a connection line by line, the responses are written in the order of the requests.
+        """
+        futures = asyncio.Queue()
+        respond = asyncio.ensure_future(self.respond(futures, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                future = asyncio.get_running_loop().create_future()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('A request must be a JSON object')
+                except ValueError as e:
+                    future.set_result({'id': None, 'error': 'Bad request: %s' % e})
+                else:
+                    # blocks when the queue is full, thus no more requests are read (backpressure)
+                    await self.queue.put((request, future))
+                await futures.put(future)
+        finally:
+            await futures.put(None)
+            await respond
+
+    @staticmethod
+    async def respond(futures, writer):
+        try:
+            while True:
+                future = await futures.get()
+                if future is None:
+                    break
+                writer.write((json.dumps(await future) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start serving on host:port (a free port if port is 0). Return the server, whose sockets tell the port.
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        self.batcher_task = asyncio.ensure_future(self.batcher())
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve_forever(self, host='127.0.0.1', port=0):
+        server = await self.start(host, port)
+        print('Serving on %s:%d ...' % server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+
+class ServiceClient:
+    """
+    A blocking client of the service.
+    """
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile('rw')
+        self.request_num = 0
+
+    def place(self, task_names, algo='DPE'):
+        return self.place_all([task_names], algo)[0]
+
+    def place_all(self, DAGs_task_names, algo='DPE'):
+        """
+        Send the requests of all the DAGs at once, then read the responses.
+        """
+        for task_names in DAGs_task_names:
+            self.request_num += 1
+            self.file.write(json.dumps({'id': self.request_num, 'algo': algo, 'task_names': list(task_names)}) + '\n')
+        self.file.flush()
+        return [json.loads(self.file.readline()) for _ in DAGs_task_names]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def get_algos(scenario, algo_names=ALGOS):
+    args, kwargs = scenario.get_algo_args()
+    return dict((name, ALGOS[name](*args, **kwargs)) for name in algo_names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve DPE, FixDoc and HEFT placements on localhost.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the scenario (see scenario_cache.py)')
+    parser.add_argument('--batch-window', type=float, default=0.005)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--queue-size', type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    service = SchedulingService(get_algos(load_scenario(args.seed)), args.seed, args.batch_window, args.max_batch,
+                                args.queue_size)
+    asyncio.run(service.serve_forever(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
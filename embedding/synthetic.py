@@ -0,0 +1,168 @@
+"""
+Generate synthetic DAGs in the layout of batch_task.csv, e.g., 'M1', 'R2_1' and 'J4_2_3' (function 4 depends on
+functions 2 and 3). Functions are numbered in topological order.
+The shapes of DAGs are
+    chain           function i depends on function i - 1,
+    fan_out         all the other functions depend on function 1,
+    fan_in          function n depends on all the other functions,
+    fork_join       function 1 forks to functions 2, ..., n - 1, which join at function n,
+    random_layered  functions are put into layers, each function depends on at most 'density' random functions of
+                    the previous layer.
+generate_trace() writes a whole synthetic trace in the layout of batch_task.csv for stress tests.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import os
+import numpy as np
+import pandas as pd
+from embedding.dag_store import build_DAG_store
+from embedding.parameters import *
+
+
+SHAPES = ['chain', 'fan_out', 'fan_in', 'fork_join', 'random_layered']
+
+# the DAGs of the synthetic trace have size_bounds[b] to size_bounds[b + 1] - 1 functions with probability size_probs[b]
+TRACE_SIZE_BOUNDS = [1, 2, 3, 11, 51, 101, MAX_FUNC_NUM + 1]
+TRACE_SIZE_PROBS = [0.3, 0.15, 0.25, 0.15, 0.08, 0.07]
+
+
+def get_parents(shape, func_num, rng=np.random, density=3):
+    """
+    Get the functions each function depends on, i.e., parents[i] is the list of functions function i + 1 depends on.
+    """
+    assert func_num > 0
+    if shape == 'chain':
+        return [[]] + [[i] for i in range(1, func_num)]
+    if shape == 'fan_out':
+        return [[]] + [[1] for _ in range(1, func_num)]
+    if shape == 'fan_in':
+        return [[] for _ in range(func_num - 1)] + [list(range(1, func_num))]
+    if shape == 'fork_join':
+        if func_num < 3:
+            return get_parents('chain', func_num)
+        return [[]] + [[1] for _ in range(2, func_num)] + [list(range(2, func_num))]
+    if shape == 'random_layered':
+        # about sqrt(func_num) functions in each layer
+        width = max(1, int(np.sqrt(func_num)))
+        layers = np.arange(func_num) // width
+        parents = []
+        for i in range(func_num):
+            if layers[i] == 0:
+                parents.append([])
+                continue
+            begin, end = (layers[i] - 1) * width, layers[i] * width
+            parents_num = min(rng.randint(1, density + 1), end - begin)
+            parents.append(sorted((rng.choice(end - begin, parents_num, replace=False) + begin + 1).tolist()))
+        return parents
+    raise ValueError('Unknown DAG shape: %s' % shape)
+
+
+def get_task_names(parents):
+    """
+    Name the functions like batch_task.csv. Entry functions are 'M', functions with one dependency are 'R' and
+    functions with several dependencies are 'J'.
+    """
+    task_names = []
+    for i, parents_i in enumerate(parents):
+        task_type = 'M' if len(parents_i) == 0 else ('R' if len(parents_i) == 1 else 'J')
+        task_names.append('_'.join([task_type + str(i + 1)] + [str(p) for p in parents_i]))
+    return task_names
+
+
+def generate_DAGs(shape, func_num, DAG_num=1, seed=0):
+    """
+    Generate DAG_num DAGs of func_num functions. Return a DataFrame in the layout of topological_order.csv
+    (only the columns task_name and job_name).
+    """
+    rng = np.random.RandomState(seed)
+    task_names, job_names = [], []
+    for k in range(DAG_num):
+        task_names.extend(get_task_names(get_parents(shape, func_num, rng)))
+        job_names.extend(['j_%s_%d_%d' % (shape, func_num, k)] * func_num)
+    return pd.DataFrame({'task_name': task_names, 'job_name': job_names})
+
+
+def generate_DAG_store(shape, func_num, DAG_num=1, seed=0):
+    """
+    Generate the DAGs into an in-memory DAG store.
+    """
+    return build_DAG_store(generate_DAGs(shape, func_num, DAG_num, seed))
+
+
+def generate_trace(trace_path, row_num, size_bounds=TRACE_SIZE_BOUNDS, size_probs=TRACE_SIZE_PROBS, density=3,
+                   independent_prob=0.1, chunk_size=CHUNK_SIZE, seed=0):
+    """
+    Write a synthetic trace of at least row_num rows into trace_path in the layout of batch_task.csv (no header).
+        size_bounds, size_probs - the distribution of the number of functions of DAGs
+        density - each function except the first one depends on 0 to density random functions before it
+        independent_prob - the probability of a job being independent tasks (named like 'task_xxx') instead of a DAG
+    The trace is generated and written in chunks of about chunk_size rows, thus the memory used does not grow with
+    row_num.
+    """
+    rng = np.random.RandomState(seed)
+    size_probs = np.asarray(size_probs, dtype=float) / np.sum(size_probs)
+    tmp_path = trace_path + '.tmp'
+    written, job_num, start_time = 0, 0, 0
+    while written < row_num:
+        chunk = generate_trace_chunk(rng, min(chunk_size, row_num - written), size_bounds, size_probs, density,
+                                     independent_prob, job_num, start_time)
+        chunk.to_csv(tmp_path, index=0, header=False, mode='w' if written == 0 else 'a')
+        written += len(chunk)
+        job_num += chunk['job_name'].nunique()
+        start_time = int(chunk['start_time'].max())
+    os.replace(tmp_path, trace_path)
+
+
+def generate_trace_chunk(rng, row_num, size_bounds, size_probs, density, independent_prob, first_job, start_time):
+    """
+    Generate the jobs of a chunk of at least row_num rows (the DAGs are not cut). All the columns are generated with
+    array operations.
+    """
+    # draw the number of functions of each DAG
+    mean_size = np.dot(size_probs, (np.array(size_bounds[:-1]) + np.array(size_bounds[1:]) - 1) / 2.)
+    sizes = np.zeros(0, dtype=np.int64)
+    while sizes.sum() < row_num:
+        batch = int(row_num / mean_size) + 1
+        buckets = rng.choice(len(size_probs), batch, p=size_probs)
+        sizes = np.concatenate([sizes, rng.randint(np.array(size_bounds)[buckets], np.array(size_bounds)[buckets + 1])])
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), row_num) + 1]
+    job_num = len(sizes)
+
+    rows = np.arange(sizes.sum())
+    jobs = np.repeat(np.arange(job_num), sizes)
+    funcs = rows - np.repeat(np.cumsum(sizes) - sizes, sizes) + 1
+
+    # the number of dependencies of each function, and the dependencies (distinct functions before it, in order)
+    deps_num = np.minimum(rng.randint(0, density + 1, len(rows)), funcs - 1)
+    dep_rows = np.repeat(rows, deps_num)
+    candidates = np.repeat(funcs - deps_num, deps_num)
+    values = (rng.rand(len(dep_rows)) * candidates).astype(np.int64)
+    values = values[np.lexsort((values, dep_rows))]
+    ranks = np.arange(len(dep_rows)) - np.repeat(np.cumsum(deps_num) - deps_num, deps_num)
+    deps = values + ranks + 1
+
+    task_types = np.where(deps_num == 0, 'M', np.where(deps_num == 1, 'R', 'J'))
+    task_names = pd.Series(task_types, dtype=object) + pd.Series(funcs).astype(str)
+    deps = pd.Series(deps).astype(str).to_numpy()
+    dep_offsets = np.cumsum(deps_num) - deps_num
+    for r in range(int(deps_num.max(initial=0))):
+        # append the r-th dependency of each function
+        has_dep = deps_num > r
+        task_names[has_dep] = task_names[has_dep] + '_' + deps[dep_offsets[has_dep] + r]
+    # the independent tasks
+    is_independent = (rng.rand(job_num) < independent_prob)[jobs]
+    task_ids = pd.Series(rng.randint(10 ** 8, 10 ** 9, is_independent.sum())).astype(str)
+    task_names[is_independent] = 'task_' + task_ids.to_numpy()
+
+    job_starts = start_time + np.cumsum(rng.randint(0, 100, job_num))
+    start_times = job_starts[jobs] + funcs * rng.randint(1, 60, len(rows))
+    return pd.DataFrame({
+        'task_name': task_names.to_numpy(),
+        'instance_num': rng.randint(1, 1000, len(rows)).astype(float),
+        'job_name': 'j_' + pd.Series(jobs + first_job + 1).astype(str),
+        'task_type': rng.randint(1, 13, len(rows)),
+        'status': 'Terminated',
+        'start_time': start_times,
+        'end_time': start_times + rng.randint(1, 300, len(rows)),
+        'plan_cpu': rng.choice([50., 100., 200.], len(rows)),
+        'plan_mem': np.round(rng.rand(len(rows)) + 0.1, 2),
+    }, columns=TRACE_COLUMNS)
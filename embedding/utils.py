@@ -3,6 +3,7 @@ Utilities.
     Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
 """
 import sys
+import numpy as np
 
 
 class ProgressBar:
@@ -33,3 +34,15 @@ def reverse_dict(d):
         for val in d[key]:
             result[val] = result.get(val, tuple()) + (key, )
     return result
+
+
+def get_DAG_begins(job_names):
+    """
+    Get the first row of each run of consecutive rows with the same job_name, followed by the number of rows.
+    """
+    if len(job_names) == 0:
+        return np.zeros(1, dtype=int)
+    changed = np.empty(len(job_names), dtype=bool)
+    changed[0] = True
+    changed[1:] = job_names[1:] != job_names[:-1]
+    return np.append(np.flatnonzero(changed), len(job_names))
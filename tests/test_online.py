@@ -0,0 +1,67 @@
+"""
+Test the online scheduling of DAGs, which compete for the same servers.
+    Author: Hailiang Zhao (hliangzhao@zju.edu.cn)
+"""
+import random
+import pytest
+import numpy as np
+from embedding.scenario import para
+from embedding.scenario_cache import build_scenario
+from embedding.dag_store import make_DAG
+from embedding.algos.online import OnlineScheduler
+from embedding.algos.dpe import DPE
+from embedding.algos.fixdoc import FixDoc
+
+
+@pytest.fixture(scope='module')
+def algo_args():
+    return build_scenario(seed=1).get_algo_args()
+
+
+@pytest.mark.parametrize('algo_class', [DPE, FixDoc])
+def test_single_function_DAG_occupies_its_server(algo_class, algo_args):
+    args, kwargs = algo_args
+    scheduler = OnlineScheduler(algo_class(*args, **kwargs), random.Random(1))
+    placement = scheduler.submit(make_DAG(['M1']), arrival_time=0.)
+    server = placement.funcs_deploy[0]
+    assert placement.response_time > 0
+    assert placement.finish_time[0] > placement.arrival_time
+    assert scheduler.busy_until[server] == placement.finish_time[0]
+
+
+@pytest.mark.parametrize('algo_class', [DPE, FixDoc])
+def test_single_function_DAGs_queue(algo_class, algo_args):
+    args, kwargs = algo_args
+    scheduler = OnlineScheduler(algo_class(*args, **kwargs), random.Random(1))
+    DAG = make_DAG(['M1'])
+    # once every server is busy, the next DAG has to wait
+    placements = [scheduler.submit(DAG, arrival_time=0.) for _ in range(para.get_server_num() + 1)]
+    assert scheduler.queueing_delay > 0
+    assert sum(p.queueing_delay for p in placements) == scheduler.queueing_delay
+
+
+@pytest.mark.parametrize('algo_class', [DPE, FixDoc])
+def test_exit_functions_wait_for_busy_servers(algo_class, algo_args):
+    args, kwargs = algo_args
+    # server 0 is by far the fastest, but it is busy with an earlier DAG
+    args = args[:2] + (np.array([50, 5, 5, 5]),) + args[3:]
+    scheduler = OnlineScheduler(algo_class(*args, **kwargs), random.Random(1))
+    scheduler.busy_until[0] = 100.
+    busy_until = scheduler.busy_until.copy()
+    placement = scheduler.submit(make_DAG(['M1', 'R2_1', 'R3_1']), arrival_time=0.)
+    for func in range(3):
+        server = placement.funcs_deploy[func]
+        assert placement.start_time[func] >= busy_until[server]
+        assert placement.finish_time[func] > placement.start_time[func]
+
+
+@pytest.mark.parametrize('algo_class', [DPE, FixDoc])
+def test_queueing_delay_is_counted_once(algo_class, algo_args):
+    args, kwargs = algo_args
+    scheduler = OnlineScheduler(algo_class(*args, **kwargs), random.Random(1))
+    scheduler.busy_until[:] = 5.
+    chain = make_DAG(['M1'] + ['R%d_%d' % (i, i - 1) for i in range(2, 11)])
+    placement = scheduler.submit(chain, arrival_time=0.)
+    # the DAG waits for the servers at most 5 seconds, however many functions it has
+    assert 0 < placement.queueing_delay <= 5. + 1e-9
+    assert placement.queueing_delay <= placement.response_time